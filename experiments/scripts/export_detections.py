@@ -0,0 +1,105 @@
+import os
+import time
+from os import path as osp
+
+import numpy as np
+import torch
+from torch.utils.data import DataLoader
+
+import yaml
+from tqdm import tqdm
+import sacred
+from sacred import Experiment
+from tracktor.frcnn_fpn import FRCNN_FPN
+from tracktor.config import get_output_dir
+from tracktor.datasets.factory import Datasets
+from tracktor.datasets.lockstep import group_by_images
+from tracktor.datasets.mot_sequence import MOT17_PUBLIC_DETS
+
+ex = Experiment()
+
+ex.add_config('experiments/cfgs/export_detections.yaml')
+
+
+def collate_images(batch):
+    return [sample['img'] for sample in batch]
+
+
+def write_detections(det_file, rows):
+    """Writes detections as MOT det.txt and as binary float32 store with the same columns.
+
+    rows: (N, 7) array with frame, id, bb_left, bb_top, bb_width, bb_height, conf sorted by frame
+    """
+    os.makedirs(osp.dirname(det_file), exist_ok=True)
+    np.save(osp.splitext(det_file)[0] + '.npy', rows.astype(np.float32))
+    with open(det_file, 'w') as of:
+        for row in rows:
+            of.write(f"{int(row[0])},-1,{row[2]:.2f},{row[3]:.2f},{row[4]:.2f},{row[5]:.2f},{row[6]:.4f},-1,-1,-1\n")
+
+
+@ex.automain
+def main(export_detections, _config, _log, _run):
+    sacred.commands.print_config(_run)
+    cfg = export_detections
+    assert cfg['dets'] not in MOT17_PUBLIC_DETS, \
+        "[!] Exporting as {} would overwrite the official detections".format(cfg['dets'])
+
+    torch.manual_seed(cfg['seed'])
+    torch.cuda.manual_seed(cfg['seed'])
+    np.random.seed(cfg['seed'])
+    torch.backends.cudnn.deterministic = True
+
+    output_dir = osp.join(get_output_dir(cfg['module_name']), cfg['name'])
+    if not osp.exists(output_dir):
+        os.makedirs(output_dir)
+    with open(osp.join(output_dir, 'sacred_config.yaml'), 'w') as outfile:
+        yaml.dump(_config, outfile, default_flow_style=False)
+
+    device = torch.device(cfg['device'])
+
+    _log.info("Initializing object detector.")
+    obj_detect = FRCNN_FPN(num_classes=2)
+    obj_detect.load_state_dict(torch.load(cfg['obj_detect_model'],
+                               map_location=lambda storage, loc: storage))
+    obj_detect.eval()
+    obj_detect.to(device)
+
+    dataset = Datasets(cfg['dataset'])
+    num_frames = 0
+    start = time.time()
+    for group in group_by_images(dataset):
+        seq = dataset[group[0]]
+        det_file = seq.get_mot17_det_file(cfg['dets'])
+        _log.info(f"Detecting: {seq}")
+
+        data_loader = DataLoader(seq, batch_size=cfg['batch_size'], shuffle=False,
+                                 num_workers=cfg['num_workers'], collate_fn=collate_images,
+                                 pin_memory=device.type == 'cuda')
+        rows = []
+        frame = 1
+        for images in tqdm(data_loader):
+            with torch.no_grad():
+                detections = obj_detect.detect_batch(images)
+            for boxes, scores in detections:
+                keep = scores > cfg['score_thresh']
+                boxes, scores = boxes[keep].cpu().numpy(), scores[keep].cpu().numpy()
+                # 0-based corners to 1-based MOT boxes, see MOT17Sequence
+                frame_rows = np.zeros((len(boxes), 7))
+                frame_rows[:, 0] = frame
+                frame_rows[:, 1] = -1
+                frame_rows[:, 2:4] = boxes[:, :2] + 1
+                frame_rows[:, 4:6] = boxes[:, 2:] - boxes[:, :2] + 1
+                frame_rows[:, 6] = scores
+                rows.append(frame_rows)
+                frame += 1
+        num_frames += frame - 1
+
+        # same precision as the det.txt
+        rows = np.concatenate(rows)
+        rows[:, 2:6] = rows[:, 2:6].round(2)
+        rows[:, 6] = rows[:, 6].round(4)
+        write_detections(det_file, rows)
+        _log.info(f"Wrote {len(rows)} detections to: {det_file}")
+
+    runtime = time.time() - start
+    _log.info(f"Detection runtime: {runtime:.2f} s for {num_frames} frames ({num_frames / runtime:.2f} Hz)")
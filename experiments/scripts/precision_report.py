@@ -0,0 +1,102 @@
+import time
+
+import numpy as np
+import torch
+
+import motmetrics as mm
+mm.lap.default_solver = 'lap'
+
+import pandas as pd
+from tqdm import tqdm
+import sacred
+from sacred import Experiment
+from tracktor.frcnn_fpn import FRCNN_FPN
+from tracktor.datasets.factory import Datasets
+from tracktor.datasets.prefetch import sequence_loader
+from tracktor.datasets.subset import SequenceSubset
+from tracktor.precision import set_inference_precision
+from tracktor.tracker import Tracker
+from tracktor.reid.resnet import resnet50
+from tracktor.utils import interpolate, get_mot_accum
+
+ex = Experiment()
+
+ex.add_config('experiments/cfgs/tracktor.yaml')
+ex.add_config('experiments/cfgs/precision_report.yaml')
+
+# hacky workaround to load the corresponding configs and not having to hardcode paths here
+ex.add_config(ex.configurations[0]._conf['tracktor']['reid_config'])
+
+
+def build_models(tracktor, reid, device, precision, channels_last):
+    obj_detect = FRCNN_FPN(num_classes=2)
+    obj_detect.load_state_dict(torch.load(tracktor['obj_detect_model'],
+                               map_location=lambda storage, loc: storage))
+    obj_detect.eval()
+    obj_detect.to(device)
+
+    reid_network = resnet50(pretrained=False, **reid['cnn'])
+    reid_network.load_state_dict(torch.load(tracktor['reid_weights'],
+                                 map_location=lambda storage, loc: storage))
+    reid_network.eval()
+    reid_network.to(device)
+
+    set_inference_precision(obj_detect, reid_network, precision, channels_last)
+    return obj_detect, reid_network
+
+
+@ex.automain
+def main(tracktor, reid, precision_report, _log, _run):
+    sacred.commands.print_config(_run)
+    cfg = precision_report
+
+    device = torch.device(tracktor['tracker']['device'])
+    sequences = [SequenceSubset(seq, tracktor['frame_split'], tracktor['frame_stride'])
+                 for seq in Datasets(cfg['dataset'])]
+
+    mh = mm.metrics.create()
+    rows = []
+    for precision in cfg['precisions']:
+        torch.manual_seed(tracktor['seed'])
+        np.random.seed(tracktor['seed'])
+
+        channels_last = cfg['channels_last'] and precision != 'fp32'
+        obj_detect, reid_network = build_models(tracktor, reid, device, precision, channels_last)
+        tracker = Tracker(obj_detect, reid_network, dict(tracktor['tracker'], device=str(device)))
+
+        runtime = 0.0
+        num_frames = 0
+        mot_accums = []
+        for seq in sequences:
+            _log.info(f"Tracking {seq} in {precision}")
+            tracker.reset()
+            start = time.time()
+            for frame in tqdm(sequence_loader(seq), total=len(seq)):
+                with torch.no_grad():
+                    tracker.step(frame)
+            runtime += time.time() - start
+            num_frames += len(seq)
+
+            results = tracker.get_results()
+            if tracktor['interpolate']:
+                results = interpolate(results)
+            mot_accums.append(get_mot_accum(results, seq))
+
+        summary = mh.compute_many(mot_accums, metrics=['mota', 'idf1', 'num_switches'],
+                                  names=[str(seq) for seq in sequences], generate_overall=True)
+        overall = summary.loc['OVERALL']
+        rows.append({
+            'precision': precision,
+            'channels_last': channels_last,
+            'MOTA': overall['mota'],
+            'IDF1': overall['idf1'],
+            'IDs': int(overall['num_switches']),
+            'Hz': num_frames / runtime,
+            'ms/frame': 1000 * runtime / num_frames})
+
+    report = pd.DataFrame(rows).set_index('precision')
+    reference = report.iloc[0]
+    report['dMOTA'] = report['MOTA'] - reference['MOTA']
+    report['dIDF1'] = report['IDF1'] - reference['IDF1']
+    report['speedup'] = report['Hz'] / reference['Hz']
+    _log.info(f"Inference precision report on {cfg['dataset']}:\n{report.to_string(float_format='{:.4f}'.format)}")
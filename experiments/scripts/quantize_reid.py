@@ -0,0 +1,102 @@
+import numpy as np
+import torch
+
+from tqdm import tqdm
+import sacred
+from sacred import Experiment
+from tracktor.datasets.factory import Datasets
+from tracktor.datasets.subset import SequenceSubset
+from tracktor.export import export_module
+from tracktor.reid.quantize import quantize_resnet
+from tracktor.reid.resnet import resnet50
+
+ex = Experiment()
+
+ex.add_config('experiments/cfgs/quantize_reid.yaml')
+
+# hacky workaround to load the corresponding configs and not having to hardcode paths here
+ex.add_config(ex.configurations[0]._conf['quantize_reid']['reid_config'])
+
+
+def gt_crops(reid_network, seqs, batch_size):
+    """Yields the ground truth ids and crops of every frame of the sequences in batches of
+    at most batch_size crops."""
+    for seq in seqs:
+        for i, data in enumerate(tqdm(seq.data, desc=str(seq))):
+            if not data['gt']:
+                continue
+            ids = list(data['gt'].keys())
+            boxes = torch.from_numpy(np.stack([data['gt'][j] for j in ids]))
+            img = seq[i]['img'].unsqueeze(0)
+            for start in range(0, len(ids), batch_size):
+                crops = reid_network.build_crops(img, boxes[start:start + batch_size])
+                yield (str(seq), i), ids[start:start + batch_size], crops
+
+
+def hit_rate(frames, gap):
+    """Fraction of the ground truth crops of a frame whose nearest crop in the frame gap
+    frames before has the same id, i.e. that would be reidentified correctly."""
+    hits = []
+    keys = sorted(frames)
+    for key in keys:
+        prev = (key[0], key[1] - gap)
+        if prev not in frames:
+            continue
+        ids, features = frames[key]
+        prev_ids, prev_features = frames[prev]
+        nearest = torch.cdist(features, prev_features).argmin(dim=1)
+        for j, n in zip(ids, nearest.tolist()):
+            if j in prev_ids:
+                hits.append(prev_ids[n] == j)
+    return np.mean(hits)
+
+
+@ex.automain
+def main(quantize_reid, reid, _log, _run):
+    sacred.commands.print_config(_run)
+    cfg = quantize_reid
+
+    torch.manual_seed(cfg['seed'])
+    np.random.seed(cfg['seed'])
+
+    reid_network = resnet50(pretrained=False, **reid['cnn'])
+    reid_network.load_state_dict(torch.load(cfg['reid_weights'],
+                                 map_location=lambda storage, loc: storage))
+    reid_network.eval()
+
+    dataset = Datasets(cfg['dataset'])
+
+    _log.info("Calibrating the int8 reid network.")
+    seqs = [SequenceSubset(seq, cfg['calibration_split'], cfg['calibration_stride']) for seq in dataset]
+    calibration_batches = (crops for _, _, crops in gt_crops(reid_network, seqs, cfg['batch_size']))
+    quantized = quantize_resnet(reid_network, calibration_batches, cfg['backend'])
+
+    export_module(quantized, torch.rand(2, 3, 256, 128), cfg['output'])
+    quantized = torch.jit.load(cfg['output'])
+    _log.info(f"Wrote int8 reid network to: {cfg['output']}")
+
+    _log.info("Evaluating the int8 against the fp32 reid network.")
+    seqs = [SequenceSubset(seq, cfg['eval_split'], cfg['eval_stride']) for seq in dataset]
+    frames = {'fp32': {}, 'int8': {}}
+    drift = []
+    cosine = []
+    with torch.no_grad():
+        for key, ids, crops in gt_crops(reid_network, seqs, cfg['batch_size']):
+            features = reid_network(crops)
+            features_int8 = quantized(crops)
+            drift.append((features_int8 - features).norm(dim=1) / features.norm(dim=1))
+            cosine.append(torch.nn.functional.cosine_similarity(features_int8, features))
+            for name, f in [('fp32', features), ('int8', features_int8)]:
+                if key in frames[name]:
+                    frames[name][key] = (frames[name][key][0] + ids, torch.cat([frames[name][key][1], f]))
+                else:
+                    frames[name][key] = (ids, f)
+
+    drift = torch.cat(drift)
+    cosine = torch.cat(cosine)
+    hits = {name: hit_rate(f, cfg['eval_gap']) for name, f in frames.items()}
+    _log.info(f"Embedding drift (relative L2) over {len(drift)} crops: mean {drift.mean():.4f}, "
+              f"95% {drift.quantile(0.95):.4f}, max {drift.max():.4f}")
+    _log.info(f"Cosine similarity to fp32: mean {cosine.mean():.4f}, min {cosine.min():.4f}")
+    _log.info(f"Reid hit rate with a gap of {cfg['eval_gap']} frames: fp32 {hits['fp32']:.4f}, "
+              f"int8 {hits['int8']:.4f} ({hits['int8'] - hits['fp32']:+.4f})")
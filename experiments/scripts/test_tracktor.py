@@ -1,10 +1,11 @@
+import copy
 import os
 import time
 from os import path as osp
 
 import numpy as np
 import torch
-from torch.utils.data import DataLoader
+import torch.multiprocessing as mp
 
 import motmetrics as mm
 mm.lap.default_solver = 'lap'
@@ -14,12 +15,21 @@ import yaml
 from tqdm import tqdm
 import sacred
 from sacred import Experiment
+from tracktor.export import load_exported
+from tracktor.feature_cache import FeatureCache
 from tracktor.frcnn_fpn import FRCNN_FPN
 from tracktor.config import get_output_dir
 from tracktor.datasets.factory import Datasets
+from tracktor.datasets.lockstep import LockstepSequences, group_by_images
+from tracktor.datasets.prefetch import prefetch_sequences, sequence_loader
+from tracktor.datasets.subset import SequenceSubset
 from tracktor.oracle_tracker import OracleTracker
+from tracktor.precision import set_inference_precision
+from tracktor.multi_stream import LockstepTracker, MultiStreamTracker
 from tracktor.tracker import Tracker
+from tracktor.reid.quantize import load_quantized
 from tracktor.reid.resnet import resnet50
+from tracktor.reid.roi_head import RoIEmbeddingHead, RoIReID
 from tracktor.utils import interpolate, plot_sequence, get_mot_accum, evaluate_mot_accums
 
 ex = Experiment()
@@ -31,10 +41,254 @@ ex.add_config(ex.configurations[0]._conf['tracktor']['reid_config'])
 ex.add_named_config('oracle', 'experiments/cfgs/oracle_tracktor.yaml')
 
 
+def build_models(tracktor, reid, device):
+    """Loads the detector and reid network to device."""
+    obj_detect = FRCNN_FPN(num_classes=2)
+    obj_detect.load_state_dict(torch.load(tracktor['obj_detect_model'],
+                               map_location=lambda storage, loc: storage))
+
+    obj_detect.eval()
+    obj_detect.to(device)
+    if tracktor['feature_cache']['dir']:
+        obj_detect.feature_cache = FeatureCache(tracktor['feature_cache']['dir'], obj_detect,
+                                                tracktor['feature_cache']['dtype'])
+
+    # reid
+    if tracktor['reid_mode'] == 'cnn':
+        reid_network = resnet50(pretrained=False, **reid['cnn'])
+        reid_network.load_state_dict(torch.load(tracktor['reid_weights'],
+                                     map_location=lambda storage, loc: storage))
+    elif tracktor['reid_mode'] == 'roi_head':
+        head = RoIEmbeddingHead(reid['cnn']['output_dim'])
+        head.load_state_dict(torch.load(tracktor['roi_head_weights'],
+                             map_location=lambda storage, loc: storage))
+        reid_network = RoIReID(obj_detect, head)
+    else:
+        raise NotImplementedError("Reid mode: {}".format(tracktor['reid_mode']))
+    reid_network.eval()
+    reid_network.to(device)
+
+    set_inference_precision(obj_detect, reid_network, tracktor['inference_precision'],
+                            tracktor['channels_last'])
+    if tracktor['export_dir']:
+        load_exported(obj_detect, reid_network, tracktor['export_dir'])
+    if tracktor['reid_int8']:
+        load_quantized(reid_network, tracktor['reid_int8'])
+
+    return obj_detect, reid_network
+
+
+def load_sequences(tracktor):
+    """Views of the frames in frame_split of all sequences of the dataset."""
+    return [SequenceSubset(seq, tracktor['frame_split'], tracktor['frame_stride'])
+            for seq in Datasets(tracktor['dataset'])]
+
+
+def build_tracker(tracktor, obj_detect, reid_network, device):
+    tracker_cfg = dict(tracktor['tracker'], device=str(device))
+    if 'oracle' in tracktor:
+        return OracleTracker(obj_detect, reid_network, tracker_cfg, tracktor['oracle'])
+    return Tracker(obj_detect, reid_network, tracker_cfg)
+
+
+def track_sequences(tracker, seqs, frames, tracktor, output_dir, show_progress=True):
+    """Tracks sequences over the same images in lockstep given an iterator over the frames
+    of their LockstepSequences, writes their results and returns the statistics of the runs."""
+    tracker.reset()
+    if tracktor['stream_results']:
+        for t, seq in zip(tracker.trackers, seqs):
+            t.results.stream(osp.join(output_dir, f'{seq}.results.bin'))
+
+    start = time.time()
+    num_frames = 0
+
+    for frame in tqdm(frames, total=len(seqs[0]), disable=not show_progress):
+        with torch.no_grad():
+            tracker.step(frame)
+        num_frames += 1
+
+    # the shared tracking time is split evenly between the sequences
+    runtime = (time.time() - start) / len(seqs)
+    return [finish_sequence(t, seq, runtime, num_frames, tracktor, output_dir)
+            for t, seq in zip(tracker.trackers, seqs)]
+
+
+def track_streams(dataset, tracktor, obj_detect, reid_network, device, output_dir):
+    """Tracks num_streams sequences at a time with one batched backbone pass over their current
+    frames. A stream continues with the next sequence as soon as its sequence is finished.
+    Yields the statistics of each sequence once it is finished."""
+    tracker = MultiStreamTracker([build_tracker(tracktor, obj_detect, reid_network, device)
+                                  for _ in range(tracktor['num_streams'])])
+    pending = iter(range(len(dataset)))
+    streams = [None] * len(tracker.trackers)
+    finished = []
+
+    def next_blob(i):
+        """Next frame of stream i, finishes its sequence and starts the next one if needed."""
+        while True:
+            if streams[i] is None:
+                seq_idx = next(pending, None)
+                if seq_idx is None:
+                    return None
+                seq = dataset[seq_idx]
+                tracker.reset(streams=[i])
+                if tracktor['stream_results']:
+                    tracker.trackers[i].results.stream(osp.join(output_dir, f'{seq}.results.bin'))
+                frames = sequence_loader(seq, tracktor['frame_workers'], tracktor['frame_prefetch'],
+                                         pin_memory=device.type == 'cuda')
+                streams[i] = {'seq_idx': seq_idx, 'frames': iter(frames), 'runtime': 0.0, 'num_frames': 0}
+
+            stream = streams[i]
+            blob = next(stream['frames'], None)
+            if blob is not None:
+                return blob
+            seq_idx = stream['seq_idx']
+            stats = finish_sequence(tracker.trackers[i], dataset[seq_idx], stream['runtime'],
+                                    stream['num_frames'], tracktor, output_dir)
+            finished.append((seq_idx, stats))
+            streams[i] = None
+
+    progress = tqdm(total=sum(len(seq) for seq in dataset))
+    while True:
+        blobs = [next_blob(i) for i in range(len(streams))]
+        yield from finished
+        finished.clear()
+
+        stepped = [i for i, blob in enumerate(blobs) if blob is not None]
+        if not stepped:
+            break
+        start = time.time()
+        with torch.no_grad():
+            tracker.step(blobs)
+        # the shared tracking time is split evenly between the streams
+        runtime = (time.time() - start) / len(stepped)
+        for i in stepped:
+            streams[i]['runtime'] += runtime
+            streams[i]['num_frames'] += 1
+        progress.update(len(stepped))
+    progress.close()
+
+
+def finish_sequence(tracker, seq, runtime, num_frames, tracktor, output_dir):
+    """Writes the results of a tracked sequence and returns the statistics of the run."""
+    results = tracker.get_results()
+
+    stats = {
+        'seq': str(seq),
+        'runtime': runtime,
+        'num_frames': num_frames,
+        'num_tracks': len(results),
+        'align_skip_rate': None,
+        'appearance_skip_rate': None,
+        'mot_accum': None}
+    if tracktor['tracker']['do_align'] and tracktor['tracker']['align_static']['max_skip'] > 0:
+        stats['align_skip_rate'] = tracker.aligner.skip_rate
+    if tracktor['tracker']['do_reid']:
+        stats['appearance_skip_rate'] = tracker.appearance_skip_rate
+
+    if tracktor['interpolate']:
+        results = interpolate(results)
+
+    if not seq.no_gt:
+        stats['mot_accum'] = get_mot_accum(results, seq)
+
+    seq.write_results(results, output_dir)
+
+    if tracktor['write_images']:
+        plot_sequence(results, seq, osp.join(output_dir, tracktor['dataset'], str(seq)))
+
+    return stats
+
+
+def log_sequence_stats(stats, output_dir, _log):
+    _log.info(f"Tracks found for {stats['seq']}: {stats['num_tracks']}")
+    _log.info(f"Runtime for {stats['seq']}: {stats['runtime']:.2f} s.")
+    if stats['align_skip_rate'] is not None:
+        _log.info(f"Skipped camera alignment for static camera: {stats['align_skip_rate']:.1%} of frames")
+    if stats['appearance_skip_rate'] is not None:
+        _log.info(f"Skipped appearance refreshes of active tracks: {stats['appearance_skip_rate']:.1%}")
+    if stats['mot_accum'] is None:
+        _log.info(f"No GT data for evaluation available.")
+    _log.info(f"Wrote predictions to: {output_dir}")
+
+
+# state of a worker process of the sequence scheduler
+_worker = {}
+
+
+def init_worker(tracktor, reid, output_dir, worker_ids, cores):
+    """Pins a worker process to its share of the CPU cores and loads its own models."""
+    worker_id = worker_ids.get()
+    worker_cores = cores[worker_id]
+    if worker_cores:
+        os.sched_setaffinity(0, worker_cores)
+        torch.set_num_threads(len(worker_cores))
+    torch.set_num_interop_threads(1)
+
+    device = torch.device(tracktor['tracker']['device'])
+    if device.type == 'cuda' and device.index is None:
+        device = torch.device('cuda', worker_id % torch.cuda.device_count())
+
+    torch.manual_seed(tracktor['seed'])
+    torch.cuda.manual_seed(tracktor['seed'])
+    np.random.seed(tracktor['seed'])
+    torch.backends.cudnn.deterministic = True
+
+    _worker['tracktor'] = tracktor
+    _worker['output_dir'] = output_dir
+    _worker['device'] = device
+    _worker['dataset'] = load_sequences(tracktor)
+    _worker['models'] = build_models(tracktor, reid, device)
+
+
+def run_worker(group):
+    seqs = [_worker['dataset'][i] for i in group]
+    tracker = LockstepTracker([build_tracker(_worker['tracktor'], *_worker['models'], _worker['device'])
+                               for _ in seqs])
+    # pool workers are daemonic and can not start frame loading workers
+    frames = sequence_loader(LockstepSequences(seqs), pin_memory=_worker['device'].type == 'cuda')
+    all_stats = track_sequences(tracker, seqs, frames, _worker['tracktor'], _worker['output_dir'],
+                                show_progress=False)
+    return list(zip(group, all_stats))
+
+
+def track_parallel(dataset, groups, tracktor, reid, output_dir, _log):
+    """Tracks the groups of sequences in worker processes, the longest ones are scheduled first.
+
+    Every worker has its own models and is pinned to an equal share of the available CPU
+    cores. Yields the statistics of each sequence once its group is finished.
+    """
+    num_workers = min(tracktor['num_workers'], len(groups))
+    if hasattr(os, 'sched_getaffinity'):
+        cores = [c.tolist() for c in np.array_split(sorted(os.sched_getaffinity(0)), num_workers)]
+    else:
+        cores = [[]] * num_workers
+
+    ctx = mp.get_context('spawn')
+    worker_ids = ctx.Queue()
+    for i in range(num_workers):
+        worker_ids.put(i)
+
+    order = sorted(groups, key=lambda group: len(dataset[group[0]]), reverse=True)
+    _log.info(f"Tracking {len(dataset)} sequences in {len(groups)} groups with {num_workers} workers.")
+    # plain dict copies of the read-only sacred configs for the workers
+    initargs = (copy.deepcopy(tracktor), copy.deepcopy(reid), output_dir, worker_ids, cores)
+    with ctx.Pool(num_workers, initializer=init_worker, initargs=initargs) as pool:
+        for group_stats in pool.imap_unordered(run_worker, order):
+            yield from group_stats
+
+
 @ex.automain
 def main(tracktor, reid, _config, _log, _run):
     sacred.commands.print_config(_run)
 
+    device = torch.device(tracktor['tracker']['device'])
+    if device.type == 'cpu':
+        if tracktor['intra_op_threads']:
+            torch.set_num_threads(tracktor['intra_op_threads'])
+        if tracktor['inter_op_threads']:
+            torch.set_num_interop_threads(tracktor['inter_op_threads'])
+
     # set all seeds
     torch.manual_seed(tracktor['seed'])
     torch.cuda.manual_seed(tracktor['seed'])
@@ -49,72 +303,56 @@ def main(tracktor, reid, _config, _log, _run):
     with open(sacred_config, 'w') as outfile:
         yaml.dump(_config, outfile, default_flow_style=False)
 
-    ##########################
-    # Initialize the modules #
-    ##########################
-
-    # object detection
-    _log.info("Initializing object detector.")
-
-    obj_detect = FRCNN_FPN(num_classes=2)
-    obj_detect.load_state_dict(torch.load(_config['tracktor']['obj_detect_model'],
-                               map_location=lambda storage, loc: storage))
-
-    obj_detect.eval()
-    obj_detect.cuda()
-
-    # reid
-    reid_network = resnet50(pretrained=False, **reid['cnn'])
-    reid_network.load_state_dict(torch.load(tracktor['reid_weights'],
-                                 map_location=lambda storage, loc: storage))
-    reid_network.eval()
-    reid_network.cuda()
-
-    # tracktor
-    if 'oracle' in tracktor:
-        tracker = OracleTracker(obj_detect, reid_network, tracktor['tracker'], tracktor['oracle'])
+    dataset = load_sequences(tracktor)
+    assert not (tracktor['num_streams'] and tracktor['lockstep']), \
+        "[!] num_streams and lockstep can not be combined"
+    if tracktor['lockstep']:
+        groups = group_by_images(dataset)
     else:
-        tracker = Tracker(obj_detect, reid_network, tracktor['tracker'])
+        groups = [[i] for i in range(len(dataset))]
+    start = time.time()
 
-    time_total = 0
-    num_frames = 0
-    mot_accums = []
-    dataset = Datasets(tracktor['dataset'])
-    for seq in dataset:
-        tracker.reset()
-
-        start = time.time()
-
-        _log.info(f"Tracking: {seq}")
-
-        data_loader = DataLoader(seq, batch_size=1, shuffle=False)
-        for i, frame in enumerate(tqdm(data_loader)):
-            if len(seq) * tracktor['frame_split'][0] <= i <= len(seq) * tracktor['frame_split'][1]:
-                with torch.no_grad():
-                    tracker.step(frame)
-                num_frames += 1
-        results = tracker.get_results()
-
-        time_total += time.time() - start
+    if tracktor['num_workers'] > 0:
+        all_stats = track_parallel(dataset, groups, tracktor, reid, output_dir, _log)
+    else:
+        ##########################
+        # Initialize the modules #
+        ##########################
 
-        _log.info(f"Tracks found: {len(results)}")
-        _log.info(f"Runtime for {seq}: {time.time() - start :.2f} s.")
+        _log.info("Initializing object detector and reid network.")
+        obj_detect, reid_network = build_models(tracktor, reid, device)
 
-        if tracktor['interpolate']:
-            results = interpolate(results)
+        def track_serial():
+            lockstep_seqs = [LockstepSequences([dataset[i] for i in group]) for group in groups]
+            sequences = prefetch_sequences(lockstep_seqs, tracktor['frame_workers'], tracktor['frame_prefetch'],
+                                           pin_memory=device.type == 'cuda')
+            for group, (lockstep_seq, frames) in zip(groups, sequences):
+                _log.info(f"Tracking: {lockstep_seq}")
+                tracker = LockstepTracker([build_tracker(tracktor, obj_detect, reid_network, device)
+                                           for _ in group])
+                all_stats = track_sequences(tracker, lockstep_seq.sequences, frames, tracktor, output_dir)
+                yield from zip(group, all_stats)
 
-        if seq.no_gt:
-            _log.info(f"No GT data for evaluation available.")
+        if tracktor['num_streams'] > 0:
+            all_stats = track_streams(dataset, tracktor, obj_detect, reid_network, device, output_dir)
         else:
-            mot_accums.append(get_mot_accum(results, seq))
+            all_stats = track_serial()
 
-        _log.info(f"Writing predictions to: {output_dir}")
-        seq.write_results(results, output_dir)
+    time_total = 0
+    num_frames = 0
+    mot_accums = {}
+    for seq_idx, stats in all_stats:
+        log_sequence_stats(stats, output_dir, _log)
 
-        if tracktor['write_images']:
-            plot_sequence(results, seq, osp.join(output_dir, tracktor['dataset'], str(seq)))
+        time_total += stats['runtime']
+        num_frames += stats['num_frames']
+        if stats['mot_accum'] is not None:
+            mot_accums[seq_idx] = stats['mot_accum']
 
     _log.info(f"Tracking runtime for all sequences (without evaluation or image writing): "
               f"{time_total:.2f} s for {num_frames} frames ({num_frames / time_total:.2f} Hz)")
+    _log.info(f"Wall time for all sequences: {time.time() - start:.2f} s")
     if mot_accums:
-        evaluate_mot_accums(mot_accums, [str(s) for s in dataset if not s.no_gt], generate_overall=True)
+        seq_idxs = sorted(mot_accums)
+        evaluate_mot_accums([mot_accums[i] for i in seq_idxs], [str(dataset[i]) for i in seq_idxs],
+                            generate_overall=True)
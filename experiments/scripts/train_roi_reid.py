@@ -0,0 +1,132 @@
+import os
+import os.path as osp
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+from torch.utils.data import ConcatDataset, DataLoader
+
+import yaml
+from tqdm import tqdm
+from sacred import Experiment
+from torchvision.ops.boxes import clip_boxes_to_image
+from tracktor.config import get_output_dir
+from tracktor.datasets.factory import Datasets
+from tracktor.datasets.subset import SequenceSubset
+from tracktor.frcnn_fpn import FRCNN_FPN
+from tracktor.reid.resnet import resnet50
+from tracktor.reid.roi_head import RoIEmbeddingHead
+
+ex = Experiment()
+ex.add_config('experiments/cfgs/roi_reid.yaml')
+
+# hacky workaround to load the corresponding configs and not having to hardcode paths here
+ex.add_config(ex.configurations[0]._conf['roi_reid']['reid_config'])
+
+
+def distill_targets(obj_detect, reid_network, blob, box_jitter=0.0):
+    """Returns the pooled FPN features and the reid embeddings of the (jittered) ground truth
+    boxes of a frame or None for frames without ground truth."""
+    if not blob['gt']:
+        return None
+    img = blob['img']
+    boxes = torch.cat(list(blob['gt'].values())).float()
+    if box_jitter > 0:
+        size = (boxes[:, 2:] - boxes[:, :2]).repeat(1, 2)
+        boxes = boxes + (torch.rand_like(boxes) * 2 - 1) * box_jitter * size
+        boxes = clip_boxes_to_image(boxes, img.shape[-2:])
+
+    obj_detect.load_image(img)
+    _, box_features = obj_detect.roi_features(boxes)
+    targets = reid_network.test_rois(img, boxes)
+    return box_features, targets
+
+
+@ex.automain
+def main(roi_reid, reid, _config):
+    cfg = roi_reid
+
+    # set all seeds
+    torch.manual_seed(cfg['seed'])
+    torch.cuda.manual_seed(cfg['seed'])
+    np.random.seed(cfg['seed'])
+    torch.backends.cudnn.deterministic = True
+
+    print(_config)
+
+    output_dir = osp.join(get_output_dir(cfg['module_name']), cfg['name'])
+    if not osp.exists(output_dir):
+        os.makedirs(output_dir)
+    with open(osp.join(output_dir, 'sacred_config.yaml'), 'w') as outfile:
+        yaml.dump(_config, outfile, default_flow_style=False)
+
+    device = torch.device(cfg['device'])
+
+    #########################
+    # Initialize dataloader #
+    #########################
+    print("[*] Initializing Dataloader")
+
+    dataset = Datasets(cfg['db_train'])
+    db_train = ConcatDataset([SequenceSubset(seq, cfg['train_split']) for seq in dataset])
+    db_train = DataLoader(db_train, batch_size=1, shuffle=True, num_workers=cfg['num_workers'])
+    db_val = ConcatDataset([SequenceSubset(seq, cfg['val_split'], cfg['val_stride']) for seq in dataset])
+    db_val = DataLoader(db_val, batch_size=1, shuffle=False, num_workers=cfg['num_workers'])
+
+    ##########################
+    # Initialize the modules #
+    ##########################
+    print("[*] Building frozen detector and reid network")
+    obj_detect = FRCNN_FPN(num_classes=2)
+    obj_detect.load_state_dict(torch.load(cfg['obj_detect_model'],
+                               map_location=lambda storage, loc: storage))
+    obj_detect.eval()
+    obj_detect.to(device)
+
+    reid_network = resnet50(pretrained=False, **reid['cnn'])
+    reid_network.load_state_dict(torch.load(cfg['reid_weights'],
+                                 map_location=lambda storage, loc: storage))
+    reid_network.eval()
+    reid_network.to(device)
+
+    head = RoIEmbeddingHead(reid['cnn']['output_dim'])
+    head.to(device)
+    optimizer = torch.optim.Adam(head.parameters(), lr=cfg['lr'], weight_decay=cfg['weight_decay'])
+
+    ##################
+    # Begin training #
+    ##################
+    print("[*] Solving ...")
+    for epoch in range(1, cfg['epochs'] + 1):
+        head.train()
+        losses = []
+        for blob in tqdm(db_train, desc=f"Epoch {epoch}"):
+            with torch.no_grad():
+                targets = distill_targets(obj_detect, reid_network, blob, cfg['box_jitter'])
+            if targets is None:
+                continue
+            box_features, targets = targets
+
+            # the tracker compares embeddings by their euclidean distance
+            loss = F.mse_loss(head(box_features), targets)
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+            losses.append(loss.item())
+
+        head.eval()
+        val_losses = []
+        val_cosine = []
+        with torch.no_grad():
+            for blob in db_val:
+                targets = distill_targets(obj_detect, reid_network, blob)
+                if targets is None:
+                    continue
+                box_features, targets = targets
+                embeddings = head(box_features)
+                val_losses.append(F.mse_loss(embeddings, targets).item())
+                val_cosine.append(F.cosine_similarity(embeddings, targets).mean().item())
+
+        print(f"[*] Epoch {epoch}: train loss {np.mean(losses):.4f}, val loss {np.mean(val_losses):.4f}, "
+              f"val cosine similarity {np.mean(val_cosine):.4f}")
+        torch.save(head.state_dict(), osp.join(output_dir, f"head_epoch_{epoch}.pth"))
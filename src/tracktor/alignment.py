@@ -0,0 +1,370 @@
+import numpy as np
+import torch
+import torch.nn.functional as F
+import cv2
+
+RGB2GRAY_WEIGHTS = [0.299, 0.587, 0.114]
+
+
+def scale_warp(warp_matrix, scale):
+	"""Converts a warp matrix to image coordinates scaled by scale."""
+	warp_matrix = warp_matrix.copy()
+	warp_matrix[:2, 2] *= scale
+	if warp_matrix.shape[0] == 3:
+		warp_matrix[2, :2] /= scale
+	return warp_matrix
+
+
+def build_backend(tracker_cfg):
+	"""Creates the camera motion estimation backend selected in the tracker config."""
+	warp_mode = eval(tracker_cfg['warp_mode'])
+	backend = tracker_cfg['align_backend']
+	if backend == 'ecc':
+		return ECCAligner(
+			warp_mode,
+			tracker_cfg['number_of_iterations'],
+			tracker_cfg['termination_eps'],
+			tracker_cfg['align_scale'],
+			tracker_cfg['align_pyramid_levels'],
+			tracker_cfg['align_warm_start'])
+	elif backend == 'sparse':
+		return SparseAligner(
+			warp_mode,
+			tracker_cfg['align_scale'],
+			**tracker_cfg['sparse_align'])
+	else:
+		raise NotImplementedError("Alignment backend: {}".format(backend))
+
+
+def build_aligner(tracker_cfg):
+	"""Creates the camera motion estimator selected in the tracker config."""
+	aligner = build_backend(tracker_cfg)
+	if tracker_cfg['align_static']['max_skip'] > 0:
+		aligner = StaticCameraAligner(aligner, **tracker_cfg['align_static'])
+	return aligner
+
+
+class Aligner(object):
+	"""Base class for estimating the camera motion between consecutive frames.
+
+	Subclasses cache whatever they need of the previous frame (see prepare). Returned warp
+	matrices are in full resolution image coordinates and map positions in the previous
+	frame to the current one.
+	"""
+
+	def __init__(self, warp_mode, scale=1.0):
+		"""
+		Args:
+			warp_mode (int): cv2.MOTION_* warp mode
+			scale (float): Downscale factor of the image the warp is estimated on
+		"""
+		self.warp_mode = warp_mode
+		self.scale = scale
+		self.reset()
+
+	def reset(self):
+		self.last_frame = None
+		self.frame = None
+
+	def identity(self):
+		if self.warp_mode == cv2.MOTION_HOMOGRAPHY:
+			return np.eye(3, 3, dtype=np.float32)
+		return np.eye(2, 3, dtype=np.float32)
+
+	def gray(self, image):
+		"""Downscaled grayscale version of an image tensor (C, H, W) as float32 array."""
+		# same weights as cv2.COLOR_RGB2GRAY, only the gray image is copied to the host
+		gray = torch.tensordot(image.new_tensor(RGB2GRAY_WEIGHTS), image, dims=1).cpu().numpy()
+		if self.scale != 1.0:
+			gray = cv2.resize(gray, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+		return gray
+
+	def prepare(self, image):
+		"""Returns the data of image which is cached for the next estimate."""
+		raise NotImplementedError
+
+	def estimate_warp(self, last_frame, frame):
+		"""Returns the warp between two prepared frames in downscaled coordinates."""
+		raise NotImplementedError
+
+	def estimate(self, image):
+		"""Returns the warp from the previous frame to image or None for the first frame."""
+		self.frame = self.prepare(image)
+		if self.last_frame is None:
+			return None
+		return scale_warp(self.estimate_warp(self.last_frame, self.frame), 1.0 / self.scale)
+
+	def next_frame(self, image):
+		"""Makes image the reference frame for the next estimate."""
+		if self.frame is None:
+			self.frame = self.prepare(image)
+		self.last_frame = self.frame
+		self.frame = None
+
+
+class ECCAligner(Aligner):
+	"""Estimates the camera motion with ECC.
+
+	Only the grayscale pyramid of the previous frame is cached. The warp is estimated
+	coarse-to-fine, starting at the smallest pyramid level, and can be initialized with the
+	warp of the previous frame pair.
+	"""
+
+	def __init__(self, warp_mode, number_of_iterations, termination_eps, scale=1.0, pyramid_levels=1,
+	             warm_start=False):
+		"""
+		Args:
+			scale (float): Downscale factor of the finest pyramid level compared to the image
+			pyramid_levels (int): Number of pyramid levels, every level halves the resolution
+			warm_start (bool): Initialize ECC with the last warp instead of the identity
+		"""
+		self.criteria = (cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, number_of_iterations, termination_eps)
+		self.pyramid_levels = pyramid_levels
+		self.warm_start = warm_start
+		super(ECCAligner, self).__init__(warp_mode, scale)
+
+	def reset(self):
+		super(ECCAligner, self).reset()
+		# in downscaled coordinates
+		self.last_warp = None
+
+	def prepare(self, image):
+		"""Grayscale pyramid, finest level first."""
+		pyramid = [self.gray(image)]
+		for _ in range(self.pyramid_levels - 1):
+			pyramid.append(cv2.pyrDown(pyramid[-1]))
+		return pyramid
+
+	def estimate_warp(self, last_pyramid, pyramid):
+		if self.warm_start and self.last_warp is not None:
+			warp_matrix = self.last_warp
+		else:
+			warp_matrix = self.identity()
+
+		# from the finest to the coarsest level
+		warp_matrix = scale_warp(warp_matrix, 1.0 / 2 ** (self.pyramid_levels - 1))
+		for level in range(self.pyramid_levels - 1, -1, -1):
+			try:
+				_, warp_matrix = cv2.findTransformECC(
+					last_pyramid[level], pyramid[level], warp_matrix, self.warp_mode, self.criteria)
+			except cv2.error:
+				# ECC did not converge, keep the estimate of the coarser level (or the initialization)
+				pass
+			if level > 0:
+				warp_matrix = scale_warp(warp_matrix, 2.0)
+
+		self.last_warp = warp_matrix
+		return warp_matrix
+
+
+class SparseAligner(Aligner):
+	"""Estimates the camera motion from sparse corners tracked with pyramidal Lucas-Kanade.
+
+	Corners are detected once per frame. Their optical flow to the next frame is fitted
+	with RANSAC to a model matching the warp mode. The cost barely depends on the image
+	resolution.
+	"""
+
+	def __init__(self, warp_mode, scale=1.0, max_corners=400, quality_level=0.01, min_distance=8,
+	             ransac_thresh=3.0):
+		"""
+		Args:
+			max_corners (int): Maximal number of corners to track
+			quality_level (float): Minimal corner quality relative to the best corner
+			min_distance (float): Minimal distance between corners in full resolution pixels
+			ransac_thresh (float): RANSAC inlier threshold in full resolution pixels
+		"""
+		self.max_corners = max_corners
+		self.quality_level = quality_level
+		self.min_distance = min_distance
+		self.ransac_thresh = ransac_thresh
+		super(SparseAligner, self).__init__(warp_mode, scale)
+
+	def prepare(self, image):
+		"""8 bit grayscale image and its corners."""
+		gray = (self.gray(image) * 255).clip(0, 255).astype(np.uint8)
+		corners = cv2.goodFeaturesToTrack(
+			gray, self.max_corners, self.quality_level, max(self.min_distance * self.scale, 1.0))
+		return gray, corners
+
+	def estimate_warp(self, last_frame, frame):
+		last_gray, last_corners = last_frame
+		gray, _ = frame
+		if last_corners is None:
+			return self.identity()
+
+		corners, status, _ = cv2.calcOpticalFlowPyrLK(last_gray, gray, last_corners, None)
+		tracked = status.reshape(-1) == 1
+		src = last_corners.reshape(-1, 2)[tracked]
+		dst = corners.reshape(-1, 2)[tracked]
+		if len(src) < 4:
+			return self.identity()
+
+		thresh = self.ransac_thresh * self.scale
+		if self.warp_mode == cv2.MOTION_TRANSLATION:
+			warp_matrix = self.identity()
+			warp_matrix[:, 2] = np.median(dst - src, axis=0)
+		elif self.warp_mode == cv2.MOTION_EUCLIDEAN:
+			warp_matrix, _ = cv2.estimateAffinePartial2D(src, dst, method=cv2.RANSAC, ransacReprojThreshold=thresh)
+			if warp_matrix is not None:
+				# remove the scale of the fitted similarity transform
+				warp_matrix[:, :2] /= np.sqrt(np.linalg.det(warp_matrix[:, :2]))
+		elif self.warp_mode == cv2.MOTION_AFFINE:
+			warp_matrix, _ = cv2.estimateAffine2D(src, dst, method=cv2.RANSAC, ransacReprojThreshold=thresh)
+		else:
+			warp_matrix, _ = cv2.findHomography(src, dst, cv2.RANSAC, thresh)
+
+		if warp_matrix is None:
+			return self.identity()
+		return warp_matrix.astype(np.float32)
+
+
+class StaticCameraAligner(object):
+	"""Skips the motion estimation of another aligner while the camera is static.
+
+	The camera counts as static once the last estimates moved no image corner by more than
+	motion pixels. Then frames are only compared by a small gray thumbnail, which costs far
+	less than the estimation. The estimation resumes after max_skip frames or as soon as two
+	consecutive thumbnails differ by more than diff_ratio times their average difference
+	during the still estimates, e.g. because the camera starts to pan. Skipped frames are not
+	prepared by the backend, the last one is only prepared if it becomes a reference.
+	"""
+
+	def __init__(self, aligner, max_skip, frames=3, motion=0.5, diff_ratio=3.0, thumb_width=128):
+		"""
+		Args:
+			aligner: Aligner doing the actual motion estimation
+			max_skip (int): Maximal number of consecutive frames without estimation
+			frames (int): Number of still estimates after which the camera counts as static
+			motion (float): Maximal corner displacement in pixels of a still estimate
+			diff_ratio (float): Maximal thumbnail difference relative to the still estimates
+			thumb_width (int): Width of the thumbnails
+		"""
+		self.aligner = aligner
+		self.max_skip = max_skip
+		self.frames = frames
+		self.motion = motion
+		self.diff_ratio = diff_ratio
+		self.thumb_width = thumb_width
+		self.reset()
+
+	def reset(self):
+		self.aligner.reset()
+		self.last_thumb = None
+		self.thumb = None
+		# reference frame which has not been handed to the backend yet
+		self.last_image = None
+		self.skipped = False
+		self.num_still = 0
+		self.still_diff_sum = 0.0
+		self.num_since_estimate = 0
+
+		self.num_estimated = 0
+		self.num_skipped = 0
+
+	@property
+	def skip_rate(self):
+		"""Fraction of frames without motion estimation since the last reset."""
+		num = self.num_estimated + self.num_skipped
+		return self.num_skipped / num if num else 0.0
+
+	def thumbnail(self, image):
+		height = max(int(round(self.thumb_width * image.size(1) / image.size(2))), 1)
+		gray = torch.tensordot(image.new_tensor(RGB2GRAY_WEIGHTS), image, dims=1)
+		return F.adaptive_avg_pool2d(gray[None, None], (height, self.thumb_width))[0, 0]
+
+	def displacement(self, warp_matrix, image):
+		"""Maximal displacement of the image corners in pixels."""
+		height, width = image.shape[1:]
+		corners = np.array([[0, 0, 1], [width, 0, 1], [0, height, 1], [width, height, 1]], dtype=np.float32)
+		warped = corners @ warp_matrix.T
+		if warped.shape[1] == 3:
+			warped = warped[:, :2] / warped[:, 2:]
+		return np.abs(warped - corners[:, :2]).max()
+
+	def estimate(self, image):
+		"""Returns the warp from the previous frame to image or None if it was skipped."""
+		self.thumb = self.thumbnail(image)
+		if self.last_thumb is None:
+			diff = None
+		else:
+			diff = (self.thumb - self.last_thumb).abs().mean().item()
+
+		self.skipped = (self.num_still >= self.frames and self.num_since_estimate < self.max_skip
+		                and diff <= self.diff_ratio * self.still_diff_sum / self.num_still)
+		if self.skipped:
+			self.num_skipped += 1
+			self.num_since_estimate += 1
+			return None
+
+		if self.last_image is not None:
+			self.aligner.next_frame(self.last_image)
+			self.last_image = None
+		warp_matrix = self.aligner.estimate(image)
+		if warp_matrix is not None:
+			self.num_estimated += 1
+			self.num_since_estimate = 0
+			if diff is not None and self.displacement(warp_matrix, image) < self.motion:
+				self.num_still += 1
+				self.still_diff_sum += diff
+			else:
+				self.num_still = 0
+				self.still_diff_sum = 0.0
+		return warp_matrix
+
+	def next_frame(self, image):
+		"""Makes image the reference frame for the next estimate."""
+		if self.thumb is None:
+			self.thumb = self.thumbnail(image)
+		self.last_thumb = self.thumb
+		self.thumb = None
+		if self.skipped:
+			self.last_image = image
+			self.skipped = False
+		else:
+			self.aligner.next_frame(image)
+			self.last_image = None
+
+
+class SharedAligner(object):
+	"""Shares an aligner between trackers which step over the same frames.
+
+	Between two calls of begin_frame the motion is estimated at most once, no matter how many
+	trackers ask for it. next_frame only records the frame, the reference frame is advanced by
+	advance once all trackers have stepped. Otherwise a tracker without active tracks, which
+	does not estimate, would move the reference to the current frame before the others.
+	"""
+
+	def __init__(self, aligner):
+		self.aligner = aligner
+		self.reset()
+
+	def reset(self):
+		self.aligner.reset()
+		self.begin_frame()
+
+	def __getattr__(self, name):
+		# e.g. skip_rate of a StaticCameraAligner
+		if name == 'aligner':
+			raise AttributeError(name)
+		return getattr(self.aligner, name)
+
+	def begin_frame(self):
+		self.estimated = False
+		self.warp_matrix = None
+		self.image = None
+
+	def estimate(self, image):
+		if not self.estimated:
+			self.warp_matrix = self.aligner.estimate(image)
+			self.estimated = True
+		return self.warp_matrix
+
+	def next_frame(self, image):
+		self.image = image
+
+	def advance(self):
+		"""Makes the frame given to next_frame the reference frame for the next estimate."""
+		if self.image is not None:
+			self.aligner.next_frame(self.image)
+			self.image = None
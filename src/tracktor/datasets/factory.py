@@ -11,7 +11,8 @@ _sets = {}
 # Fill all available datasets, change here to modify / add new datasets.
 for split in ['train', 'test', 'all', '01', '02', '03', '04', '05', '06', '07', '08', '09',
               '10', '11', '12', '13', '14']:
-    for dets in ['DPM16', 'DPM_RAW16', 'DPM17', 'FRCNN17', 'SDP17', '17', '']:
+    # FPN17 are the private detections written by experiments/scripts/export_detections.py
+    for dets in ['DPM16', 'DPM_RAW16', 'DPM17', 'FRCNN17', 'SDP17', 'FPN17', '17', '']:
         name = f'mot17_{split}_{dets}'
         _sets[name] = (lambda *args, split=split,
                        dets=dets: MOT17Wrapper(split, dets, *args))
@@ -0,0 +1,39 @@
+from collections import OrderedDict
+
+import torch
+from torch.utils.data import Dataset
+
+
+def group_by_images(sequences):
+    """Groups the indices of sequences over the same images, e.g. the DPM, FRCNN and SDP
+    variants of a MOT17 sequence. Groups are in the order of their first sequence."""
+    groups = OrderedDict()
+    for i, seq in enumerate(sequences):
+        key = tuple(data['im_path'] for data in seq.data)
+        groups.setdefault(key, []).append(i)
+    return list(groups.values())
+
+
+class LockstepSequences(Dataset):
+    """Frames of several sequences over the same images.
+
+    Every image is decoded once. The blob is the one of the first sequence, except that
+    blob['dets'] is a list with the public detections of every sequence.
+    """
+
+    def __init__(self, sequences):
+        self.sequences = sequences
+        im_paths = [[data['im_path'] for data in seq.data] for seq in sequences]
+        assert all(paths == im_paths[0] for paths in im_paths), \
+            "[!] Lockstep sequences have to be over the same images"
+
+    def __len__(self):
+        return len(self.sequences[0])
+
+    def __str__(self):
+        return '+'.join(str(seq) for seq in self.sequences)
+
+    def __getitem__(self, idx):
+        sample = self.sequences[0][idx]
+        sample['dets'] = [torch.tensor([det[:4] for det in seq.data[idx]['dets']]) for seq in self.sequences]
+        return sample
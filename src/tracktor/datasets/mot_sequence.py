@@ -13,6 +13,9 @@ import cv2
 from ..config import cfg
 from torchvision.transforms import ToTensor
 
+# official public detections of MOT17, never overwritten by experiments/scripts/export_detections.py
+MOT17_PUBLIC_DETS = ['DPM17', 'FRCNN17', 'SDP17']
+
 
 class MOT17Sequence(Dataset):
     """Multiple Object Tracking Dataset.
@@ -130,17 +133,33 @@ class MOT17Sequence(Dataset):
         det_file = self.get_det_file(label_path, raw_label_path, mot17_label_path)
 
         if osp.exists(det_file):
-            with open(det_file, "r") as inf:
-                reader = csv.reader(inf, delimiter=',')
-                for row in reader:
-                    x1 = float(row[2]) - 1
-                    y1 = float(row[3]) - 1
+            # binary store of export_detections.py, float32 rows with the columns of the det.txt
+            # sorted by frame. The official detections are always read from their det.txt.
+            det_store = osp.splitext(det_file)[0] + '.npy'
+            if self._dets not in MOT17_PUBLIC_DETS and osp.exists(det_store):
+                rows = np.load(det_store)
+                if len(rows):
+                    bbs = np.empty((len(rows), 5), dtype=np.float32)
+                    bbs[:, :2] = rows[:, 2:4] - 1
                     # This -1 accounts for the width (width of 1 x1=x2)
-                    x2 = x1 + float(row[4]) - 1
-                    y2 = y1 + float(row[5]) - 1
-                    score = float(row[6])
-                    bb = np.array([x1,y1,x2,y2, score], dtype=np.float32)
-                    dets[int(float(row[0]))].append(bb)
+                    bbs[:, 2:4] = bbs[:, :2] + rows[:, 4:6] - 1
+                    bbs[:, 4] = rows[:, 6]
+                    frames = rows[:, 0].astype(np.int64)
+                    starts = np.flatnonzero(np.diff(frames)) + 1
+                    for frame, frame_bbs in zip(frames[np.r_[0, starts]], np.split(bbs, starts)):
+                        dets[int(frame)] = list(frame_bbs)
+            else:
+                with open(det_file, "r") as inf:
+                    reader = csv.reader(inf, delimiter=',')
+                    for row in reader:
+                        x1 = float(row[2]) - 1
+                        y1 = float(row[3]) - 1
+                        # This -1 accounts for the width (width of 1 x1=x2)
+                        x2 = x1 + float(row[4]) - 1
+                        y2 = y1 + float(row[5]) - 1
+                        score = float(row[6])
+                        bb = np.array([x1,y1,x2,y2, score], dtype=np.float32)
+                        dets[int(float(row[0]))].append(bb)
 
         for i in range(1,seqLength+1):
             im_path = osp.join(imDir,"{:06d}.jpg".format(i))
@@ -169,6 +188,11 @@ class MOT17Sequence(Dataset):
             det_file = ""
         return det_file
 
+    def get_mot17_det_file(self, dets):
+        """det.txt of the public detections dets (e.g. FRCNN17) of this MOT17 sequence."""
+        split = 'train' if self._seq_name in self._train_folders else 'test'
+        return osp.join(self._mot17_label_dir, split, f"{self._seq_name}-{dets[:-2]}", 'det', 'det.txt')
+
     def __str__(self):
         return f"{self._seq_name}-{self._dets[:-2]}"
 
@@ -0,0 +1,35 @@
+from torch.utils.data import DataLoader
+
+
+def sequence_loader(seq, num_workers=0, prefetch_factor=2, pin_memory=False):
+    """DataLoader returning the frames of a sequence in order as blobs of batch size 1.
+
+    With num_workers > 0 the frames are decoded by worker processes, which keep up to
+    prefetch_factor frames each decoded ahead in shared memory.
+    """
+    kwargs = {}
+    if num_workers > 0:
+        kwargs['prefetch_factor'] = prefetch_factor
+    return DataLoader(seq, batch_size=1, shuffle=False, num_workers=num_workers,
+                      pin_memory=pin_memory, **kwargs)
+
+
+def prefetch_sequences(sequences, num_workers=0, prefetch_factor=2, pin_memory=False):
+    """Yields every sequence together with an iterator over its frames.
+
+    The workers of the next sequence are started as soon as a sequence is yielded, so its
+    first frames are already decoded when the current sequence is finished.
+    """
+    sequences = list(sequences)
+    if not sequences:
+        return
+
+    def load(seq):
+        return iter(sequence_loader(seq, num_workers, prefetch_factor, pin_memory))
+
+    next_frames = load(sequences[0])
+    for i, seq in enumerate(sequences):
+        frames = next_frames
+        if i + 1 < len(sequences):
+            next_frames = load(sequences[i + 1])
+        yield seq, frames
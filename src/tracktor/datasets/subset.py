@@ -0,0 +1,38 @@
+from torch.utils.data import Dataset
+
+
+class SequenceSubset(Dataset):
+    """View of a part of the frames of a sequence.
+
+    Only the frames in frame_split, given as [start percentage, end percentage] of the
+    sequence, and of these every frame_stride-th are in the view, all other frames are never
+    loaded. Frames are indexed within the view, write_results maps them back to the frames of
+    the sequence.
+    """
+
+    def __init__(self, seq, frame_split=(0.0, 1.0), frame_stride=1):
+        self.seq = seq
+        seq_len = len(seq)
+        self.frames = [i for i in range(seq_len)
+                       if seq_len * frame_split[0] <= i <= seq_len * frame_split[1]][::frame_stride]
+        self.data = [seq.data[i] for i in self.frames]
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __getitem__(self, idx):
+        return self.seq[self.frames[idx]]
+
+    def __str__(self):
+        return str(self.seq)
+
+    def __getattr__(self, name):
+        # e.g. no_gt, seq is not set yet while unpickling
+        if name == 'seq':
+            raise AttributeError(name)
+        return getattr(self.seq, name)
+
+    def write_results(self, all_tracks, output_dir):
+        all_tracks = {i: {self.frames[frame]: bb for frame, bb in track.items()}
+                      for i, track in all_tracks.items()}
+        self.seq.write_results(all_tracks, output_dir)
@@ -0,0 +1,78 @@
+import hashlib
+import os
+import os.path as osp
+
+import torch
+
+from .feature_cache import FeatureCache
+from .precision import Autocast
+from .reid.resnet import ResNet
+
+
+def export_module(module, example_inputs, path):
+    """Traces and freezes a module in eval mode and saves it to path.
+
+    The frozen graph has the weights inlined, loading it needs no Python model code.
+    """
+    with torch.no_grad():
+        traced = torch.jit.trace(module.eval(), example_inputs, strict=False)
+        frozen = torch.jit.freeze(traced)
+
+    os.makedirs(osp.dirname(path), exist_ok=True)
+    # write to a temporary file first, other processes may load the artifacts at the same time
+    tmp = '{}.{}.tmp'.format(path, os.getpid())
+    torch.jit.save(frozen, tmp)
+    os.replace(tmp, path)
+
+
+def load_module(module, example_inputs, export_dir, name, device, variant=''):
+    """Loads the exported module or exports it first if it is not cached in export_dir yet.
+
+    The artifact is keyed by a hash of the weights, the variant (e.g. precision and memory
+    format, which are not part of the weights) and the torch version. Graph optimizations for
+    inference are applied after loading, the optimized graph can not be saved.
+    """
+    key = '{}-{}-{}'.format(FeatureCache.weights_hash(module), variant, torch.__version__)
+    path = osp.join(export_dir, '{}-{}.pt'.format(name, hashlib.sha1(key.encode()).hexdigest()))
+    if not osp.exists(path):
+        export_module(module, example_inputs, path)
+
+    exported = torch.jit.load(path, map_location=device)
+    return torch.jit.optimize_for_inference(exported)
+
+
+def unwrap(module):
+    """The module wrapped by set_inference_precision."""
+    return module.module if isinstance(module, Autocast) else module
+
+
+def load_exported(obj_detect, reid_network, export_dir):
+    """Replaces the backbone, the ROI box head and predictor of the detector and the reid
+    network with their exported TorchScript modules. A RoIReID runs on the exported box
+    features and is kept as it is.
+
+    Has to be called after the weights are loaded and after set_inference_precision, the
+    autocast casts and memory format are traced into the exported graphs.
+    """
+    device = next(obj_detect.parameters()).device
+    variant = '{}-{}'.format(obj_detect.inference_precision,
+                             'channels_last' if obj_detect.channels_last else 'contiguous')
+    roi_heads = obj_detect.roi_heads
+    out_channels = unwrap(obj_detect.backbone).out_channels
+    representation_size = unwrap(roi_heads.box_predictor).cls_score.in_features
+    resolution = roi_heads.box_roi_pool.output_size[0]
+
+    # the traced graphs are independent of the spatial size and the number of boxes
+    obj_detect.backbone = load_module(
+        obj_detect.backbone, torch.rand(1, 3, 256, 320, device=device), export_dir, 'backbone', device, variant)
+    roi_heads.box_head = load_module(
+        roi_heads.box_head, torch.rand(2, out_channels, resolution, resolution, device=device),
+        export_dir, 'box_head', device, variant)
+    roi_heads.box_predictor = load_module(
+        roi_heads.box_predictor, torch.rand(2, representation_size, device=device),
+        export_dir, 'box_predictor', device, variant)
+
+    if isinstance(reid_network, ResNet):
+        reid_network.exported_forward = load_module(
+            Autocast(reid_network, reid_network.autocast_dtype, obj_detect.channels_last),
+            torch.rand(2, 3, 256, 128, device=device), export_dir, 'reid', device, variant)
@@ -5,6 +5,7 @@ import torch.nn.functional as F
 
 from torchvision.models.detection import FasterRCNN
 from torchvision.models.detection.backbone_utils import resnet_fpn_backbone
+from torchvision.models.detection.image_list import ImageList
 from torchvision.models.detection.transform import resize_boxes
 
 
@@ -17,6 +18,12 @@ class FRCNN_FPN(FasterRCNN):
         self.original_image_sizes = None
         self.preprocessed_images = None
         self.features = None
+        self.batch_cache = None
+        # optional persistent cache of the backbone features, see FeatureCache
+        self.feature_cache = None
+        # set by set_inference_precision
+        self.inference_precision = 'fp32'
+        self.channels_last = False
 
     def detect(self, img):
         device = list(self.parameters())[0].device
@@ -26,14 +33,43 @@ class FRCNN_FPN(FasterRCNN):
 
         return detections['boxes'].detach(), detections['scores'].detach()
 
-    def predict_boxes(self, boxes):
+    def detect_batch(self, images):
+        """Detects on a batch (tensor or list) of images and returns the boxes and scores of
+        every image."""
+        device = list(self.parameters())[0].device
+        images = [img.to(device) for img in images]
+
+        detections = self(images)
+
+        return [(d['boxes'].detach(), d['scores'].detach()) for d in detections]
+
+    def detect_loaded_image(self):
+        """Detects on the image given to load_image without running the backbone again.
+
+        Only the RPN and ROI heads are evaluated on the cached features. The result equals
+        detect() on the same image.
+        """
+        proposals, _ = self.rpn(self.preprocessed_images, self.features, None)
+        detections, _ = self.roi_heads(self.features, proposals, self.preprocessed_images.image_sizes, None)
+        detections = self.transform.postprocess(
+            detections, self.preprocessed_images.image_sizes, self.original_image_sizes)[0]
+
+        return detections['boxes'].detach(), detections['scores'].detach()
+
+    def roi_features(self, boxes):
+        """Pools the FPN features of the image given to load_image for boxes in image
+        coordinates. Returns the boxes resized to the preprocessed image and their features."""
         device = list(self.parameters())[0].device
         boxes = boxes.to(device)
 
         boxes = resize_boxes(boxes, self.original_image_sizes[0], self.preprocessed_images.image_sizes[0])
+        box_features = self.roi_heads.box_roi_pool(self.features, [boxes], self.preprocessed_images.image_sizes)
+        return boxes, box_features
+
+    def predict_boxes(self, boxes):
+        boxes, box_features = self.roi_features(boxes)
         proposals = [boxes]
 
-        box_features = self.roi_heads.box_roi_pool(self.features, proposals, self.preprocessed_images.image_sizes)
         box_features = self.roi_heads.box_head(box_features)
         class_logits, box_regression = self.roi_heads.box_predictor(box_features)
 
@@ -63,15 +99,40 @@ class FRCNN_FPN(FasterRCNN):
         pred_scores = pred_scores[:, 1:].squeeze(dim=1).detach()
         return pred_boxes, pred_scores
 
-    def load_image(self, images):
+    def load_image(self, images, image_paths=None):
+        """Runs the backbone on a batch (tensor or list) of images and caches the features.
+
+        Images of different sizes are padded to a common size. For a batch, select_image
+        restricts the cache to one of the images for predict_boxes and detect_loaded_image.
+        With a feature_cache and the image_paths, features are read from and written to it.
+        """
         device = list(self.parameters())[0].device
-        images = images.to(device)
+        images = [img.to(device) for img in images]
 
         self.original_image_sizes = [img.shape[-2:] for img in images]
 
-        preprocessed_images, _ = self.transform(images, None)
-        self.preprocessed_images = preprocessed_images
+        use_cache = self.feature_cache is not None and image_paths is not None
+        cached = self.feature_cache.load(image_paths, device) if use_cache else None
+        if cached is not None:
+            self.preprocessed_images, self.features = cached
+        else:
+            preprocessed_images, _ = self.transform(images, None)
+            self.preprocessed_images = preprocessed_images
+
+            self.features = self.backbone(preprocessed_images.tensors)
+            if isinstance(self.features, torch.Tensor):
+                self.features = OrderedDict([(0, self.features)])
+
+            if use_cache:
+                self.feature_cache.store(image_paths, self.preprocessed_images, self.features)
+
+        self.batch_cache = (self.original_image_sizes, self.preprocessed_images, self.features)
+
+    def select_image(self, index):
+        """Restricts the features cached by load_image to the image at index of the batch."""
+        original_image_sizes, preprocessed_images, features = self.batch_cache
 
-        self.features = self.backbone(preprocessed_images.tensors)
-        if isinstance(self.features, torch.Tensor):
-            self.features = OrderedDict([(0, self.features)])
+        self.original_image_sizes = original_image_sizes[index:index + 1]
+        self.preprocessed_images = ImageList(
+            preprocessed_images.tensors[index:index + 1], preprocessed_images.image_sizes[index:index + 1])
+        self.features = OrderedDict((k, v[index:index + 1]) for k, v in features.items())
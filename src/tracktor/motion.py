@@ -0,0 +1,156 @@
+import torch
+from torchvision.ops.boxes import box_convert
+
+from .utils import warp_boxes
+
+
+def build_motion_model(motion_model_cfg, bank):
+	"""Creates the motion model selected in the motion_model config."""
+	model = motion_model_cfg['model']
+	if model == 'mean_velocity':
+		return MeanVelocityModel(bank, motion_model_cfg['center_only'])
+	elif model == 'kalman':
+		return KalmanModel(bank, motion_model_cfg['center_only'], **motion_model_cfg['kalman'])
+	else:
+		raise NotImplementedError("Motion model: {}".format(model))
+
+
+class MeanVelocityModel(object):
+	"""Moves tracks with their average velocity over the position history of the TrackBank.
+
+	The history of every track holds up to n_steps + 1 positions, the average velocity
+	between consecutive positions is the difference of the newest and the oldest one divided
+	by the number of steps. Inactive tracks keep moving with their last velocity.
+	"""
+
+	def __init__(self, bank, center_only):
+		self.bank = bank
+		self.center_only = center_only
+
+	def reset(self):
+		pass
+
+	def add(self, slots):
+		pass
+
+	def update(self, slots):
+		pass
+
+	def warp(self, slots, warp_matrix):
+		self.bank.last_pos[slots] = warp_boxes(self.bank.last_pos[slots], warp_matrix)
+
+	def predict(self, active, inactive):
+		"""Estimates the velocity of the active tracks and moves them and the inactive ones."""
+		bank = self.bank
+		if len(active):
+			num_steps = bank.last_pos_len[active] - 1
+			first = bank.last_pos[active, bank.hist_size - 1 - num_steps]
+			last = bank.last_pos[active, -1]
+			if self.center_only:
+				first = box_convert(first, 'xyxy', 'cxcywh')[:, :2]
+				last = box_convert(last, 'xyxy', 'cxcywh')[:, :2]
+			v = (last - first) / num_steps.view(-1, 1).to(last)
+			bank.last_v[active, :v.size(1)] = v
+			bank.last_v_len[active] = v.size(1)
+
+		inactive = inactive[bank.last_v_len[inactive] > 0]
+		slots = torch.cat([active, inactive])
+		if len(slots):
+			v = bank.last_v[slots]
+			if self.center_only:
+				v = v[:, :2].repeat(1, 2)
+			bank.pos[slots] = bank.pos[slots] + v
+
+
+class KalmanModel(object):
+	"""Constant velocity Kalman filter on the box center, width and height of all tracks.
+
+	The state (cx, cy, w, h, vx, vy, vw, vh) and its covariance are kept in batched tensors
+	indexed by the TrackBank slots. The noise scales with the box size. New tracks are
+	initialized with their first measurement, after that every position of an active track
+	at the start of a frame is a measurement.
+	"""
+
+	def __init__(self, bank, center_only, std_weight_position=1. / 20, std_weight_velocity=1. / 160):
+		"""
+		Args:
+			center_only (bool): Keep width and height constant in the prediction
+			std_weight_position (float): Position noise relative to the box size
+			std_weight_velocity (float): Velocity noise relative to the box size
+		"""
+		self.bank = bank
+		self.std_weight_position = std_weight_position
+		self.std_weight_velocity = std_weight_velocity
+
+		self.motion_mat = torch.eye(8, device=bank.device)
+		for i in range(2 if center_only else 4):
+			self.motion_mat[i, 4 + i] = 1.0
+		self.reset()
+
+	def reset(self):
+		self.mean = torch.zeros(0, 8, device=self.bank.device)
+		self.covariance = torch.zeros(0, 8, 8, device=self.bank.device)
+		# tracks which still wait for their first measurement
+		self.new = torch.zeros(0, dtype=torch.bool)
+
+	def _fit(self):
+		"""Grows the state with the bank."""
+		num = self.bank.capacity - len(self.new)
+		if num > 0:
+			self.mean = torch.cat([self.mean, self.mean.new_zeros(num, 8)])
+			self.covariance = torch.cat([self.covariance, self.covariance.new_zeros(num, 8, 8)])
+			self.new = torch.cat([self.new, self.new.new_zeros(num)])
+
+	def _std(self, size, weight_position, weight_velocity):
+		size = size.repeat(1, 2)
+		return torch.cat([weight_position * size, weight_velocity * size], 1)
+
+	def add(self, slots):
+		self._fit()
+		self.new[slots] = True
+
+	def update(self, slots):
+		"""Corrects the state with the current positions of the tracks in slots."""
+		self._fit()
+		measurement = box_convert(self.bank.pos[slots], 'xyxy', 'cxcywh')
+		new = self.new[slots]
+
+		# initialize new tracks
+		init = slots[new]
+		if len(init):
+			std = self._std(measurement[new, 2:], 2 * self.std_weight_position, 10 * self.std_weight_velocity)
+			self.mean[init] = torch.cat([measurement[new], torch.zeros_like(measurement[new])], 1)
+			self.covariance[init] = torch.diag_embed(std ** 2)
+			self.new[init] = False
+
+		slots, measurement = slots[~new], measurement[~new]
+		if len(slots):
+			mean = self.mean[slots]
+			covariance = self.covariance[slots]
+			std = self.std_weight_position * mean[:, 2:4].repeat(1, 2)
+			projected_cov = covariance[:, :4, :4] + torch.diag_embed(std ** 2)
+			# Kalman gain (covariance is symmetric): K^T = S^-1 H P
+			kalman_gain = torch.linalg.solve(projected_cov, covariance[:, :4]).transpose(1, 2)
+			innovation = measurement - mean[:, :4]
+			self.mean[slots] = mean + torch.matmul(kalman_gain, innovation.unsqueeze(2)).squeeze(2)
+			self.covariance[slots] = covariance - torch.matmul(kalman_gain, covariance[:, :4])
+
+	def warp(self, slots, warp_matrix):
+		"""Moves the box part of the states with the camera, velocities are kept."""
+		self._fit()
+		boxes = box_convert(self.mean[slots, :4], 'cxcywh', 'xyxy')
+		self.mean[slots, :4] = box_convert(warp_boxes(boxes, warp_matrix), 'xyxy', 'cxcywh')
+
+	def predict(self, active, inactive):
+		"""Predicts the states of all given tracks and moves them to the predicted boxes."""
+		self._fit()
+		# inactive tracks without a measurement keep their position
+		slots = torch.cat([active, inactive[~self.new[inactive]]])
+		if len(slots):
+			mean = self.mean[slots]
+			std = self._std(mean[:, 2:4], self.std_weight_position, self.std_weight_velocity)
+			mean = torch.matmul(mean, self.motion_mat.t())
+			covariance = torch.matmul(torch.matmul(self.motion_mat, self.covariance[slots]), self.motion_mat.t())
+			self.mean[slots] = mean
+			self.covariance[slots] = covariance + torch.diag_embed(std ** 2)
+			self.bank.pos[slots] = box_convert(mean[:, :4], 'cxcywh', 'xyxy')
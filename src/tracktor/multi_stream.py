@@ -0,0 +1,92 @@
+from .alignment import SharedAligner
+
+
+class MultiStreamTracker(object):
+	"""Tracks several camera streams at once with a shared detector and reid network.
+
+	Every stream has its own tracker state. Per step the backbone runs once on the current
+	frames of all streams, each tracker then regresses, detects and reidentifies on its
+	slice of the batched features. Frames of different sizes are padded to a common size,
+	which slightly changes the features near their borders.
+	"""
+
+	def __init__(self, trackers):
+		self.obj_detect = trackers[0].obj_detect
+		assert all(t.obj_detect is self.obj_detect for t in trackers), \
+			"[!] Multi-stream trackers have to share the detector"
+		self.trackers = trackers
+
+	def reset(self, hard=True, streams=None):
+		"""Resets all or the given streams."""
+		for i in range(len(self.trackers)) if streams is None else streams:
+			self.trackers[i].reset(hard)
+
+	def step(self, blobs):
+		"""Does one tracking step for every stream.
+
+		Args:
+			blobs (list): One blob per stream as for Tracker.step, None for streams without a
+				new frame
+		"""
+		streams = [i for i, blob in enumerate(blobs) if blob is not None]
+		if not streams:
+			return
+
+		image_paths = None
+		if all('img_path' in blobs[i] for i in streams):
+			image_paths = [blobs[i]['img_path'][0] for i in streams]
+		self.obj_detect.load_image([blobs[i]['img'][0] for i in streams], image_paths)
+		for index, i in enumerate(streams):
+			self.obj_detect.select_image(index)
+			self.trackers[i].step(blobs[i], load_image=False)
+
+	def get_results(self):
+		"""Results of every stream as returned by Tracker.get_results."""
+		return [tracker.get_results() for tracker in self.trackers]
+
+
+class LockstepTracker(object):
+	"""Steps several trackers over the same frames with one backbone pass per frame.
+
+	The trackers must share the detector and can differ in their config, e.g. thresholds
+	or inactive_patience, and in their public detections. With share_aligner the camera
+	motion is only estimated once per frame by the aligner of the first tracker, which
+	requires the same alignment settings for all trackers.
+	"""
+
+	def __init__(self, trackers, share_aligner=True):
+		self.obj_detect = trackers[0].obj_detect
+		assert all(t.obj_detect is self.obj_detect for t in trackers), \
+			"[!] Lockstep trackers have to share the detector"
+		self.trackers = trackers
+
+		self.aligner = None
+		if share_aligner:
+			self.aligner = SharedAligner(trackers[0].aligner)
+			for tracker in trackers:
+				tracker.aligner = self.aligner
+
+	def reset(self, hard=True):
+		for tracker in self.trackers:
+			tracker.reset(hard)
+
+	def step(self, blob):
+		"""Does one tracking step for every tracker.
+
+		blob['dets'] is either shared by all trackers or a list with the public detections
+		of each tracker, see LockstepSequences.
+		"""
+		self.obj_detect.load_image(blob['img'], blob.get('img_path'))
+		if self.aligner is not None:
+			self.aligner.begin_frame()
+		for i, tracker in enumerate(self.trackers):
+			tracker_blob = blob
+			if isinstance(blob['dets'], list):
+				tracker_blob = dict(blob, dets=blob['dets'][i])
+			tracker.step(tracker_blob, load_image=False)
+		if self.aligner is not None:
+			self.aligner.advance()
+
+	def get_results(self):
+		"""Results of every tracker as returned by Tracker.get_results."""
+		return [tracker.get_results() for tracker in self.trackers]
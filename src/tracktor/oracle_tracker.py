@@ -5,6 +5,7 @@ from scipy.optimize import linear_sum_assignment
 
 from torchvision.ops.boxes import clip_boxes_to_image, nms
 
+from .track_bank import Track, slots_of
 from .tracker import Tracker
 from .utils import bbox_overlaps
 
@@ -19,8 +20,8 @@ class OracleTracker(Tracker):
 		self.regress = oracle_cfg['regress']
 		self.pos_oracle_center_only = oracle_cfg['pos_oracle_center_only']
 
-	def tracks_to_inactive(self, tracks):
-		super(OracleTracker, self).tracks_to_inactive(tracks)
+	def tracks_to_inactive(self, slots):
+		super(OracleTracker, self).tracks_to_inactive(slots)
 
 		# only allow one track per GT in reid patience buffer
 		if self.reid_oracle:
@@ -28,16 +29,16 @@ class OracleTracker(Tracker):
 			for t in reversed(self.inactive_tracks):
 				if t.gt_id not in [t.gt_id for t in inactive_tracks]:
 					inactive_tracks.append(t)
-			self.inactive_tracks = inactive_tracks
+			self.bank.remove(self.bank.inactive())
+			self.bank.deactivate(slots_of(inactive_tracks))
 
 	def add(self, new_det_pos, new_det_scores, new_det_features, blob):
-		super(OracleTracker, self).add(
+		slots = super(OracleTracker, self).add(
 			new_det_pos, new_det_scores, new_det_features)
 
-		num_new = new_det_pos.size(0)
-		for t in self.tracks[-num_new:]:
+		for t in [Track(self.bank, s) for s in slots.tolist()]:
 			gt = blob['gt']
-			boxes = torch.cat(list(gt.values()), 0).cuda()
+			boxes = torch.cat(list(gt.values()), 0).to(self.device)
 			# boxes = clip_boxes(Variable(boxes), blob['im_info'][0][:2]).data
 			tracks_iou = bbox_overlaps(t.pos, boxes).cpu().numpy()
 			ind = np.where(tracks_iou == np.max(tracks_iou))[1]
@@ -48,49 +49,43 @@ class OracleTracker(Tracker):
 					gt_id = list(gt.keys())[ind]
 					t.gt_id = gt_id
 					if self.pos_oracle:
-						t.pos = gt[gt_id].cuda()
+						t.pos = gt[gt_id].to(self.device)
+
+		return slots
 
 	def regress_tracks(self, blob):
-		pos = self.get_pos()
+		active = self.bank.active()
 
 		# regress
-		boxes, scores = self.obj_detect.predict_boxes(pos)
+		boxes, scores = self.obj_detect.predict_boxes(self.bank.pos[active])
 		pos = clip_boxes_to_image(boxes, blob['img'].shape[-2:])
 
-		s = []
-		for i in range(len(self.tracks) - 1, -1, -1):
-			t = self.tracks[i]
-			t.score = scores[i]
-
-			if scores[i] <= self.regression_person_thresh and not self.kill_oracle:
-				self.tracks_to_inactive([t])
-			else:
-				s.append(scores[i])
-				if self.regress:
-					t.pos = pos[i].view(1, -1)
+		self.bank.score[active] = scores
+		alive = torch.gt(scores, self.regression_person_thresh)
+		if self.kill_oracle:
+			alive = torch.ones_like(alive)
+		alive_cpu = alive.cpu()
+		if self.regress:
+			self.bank.pos[active[alive_cpu]] = pos[alive]
+		self.tracks_to_inactive(active[~alive_cpu].flip(0))
 
-		return torch.Tensor(s[::-1]).cuda()
+		return scores[alive]
 
-	def reid(self, blob, new_det_pos, new_det_scores):
-		new_det_features = [torch.zeros(0).cuda() for _ in range(len(new_det_pos))]
+	def reid(self, blob, new_det_pos, new_det_scores, det_features=None):
+		new_det_features = [torch.zeros(0, device=self.device) for _ in range(len(new_det_pos))]
 
 		if self.do_reid:
-			new_det_features = self.reid_network.test_rois(
-				blob['img'], new_det_pos).data
-
-			if len(self.inactive_tracks) >= 1:
-				# calculate appearance distances
-				dist_mat, pos = [], []
-				for t in self.inactive_tracks:
-					dist_mat.append(torch.cat([t.test_features(feat.view(1, -1))
-					                           for feat in new_det_features], dim=1))
-					pos.append(t.pos)
-				if len(dist_mat) > 1:
-					dist_mat = torch.cat(dist_mat, 0)
-					pos = torch.cat(pos, 0)
-				else:
-					dist_mat = dist_mat[0]
-					pos = pos[0]
+			new_det_features = det_features
+			if new_det_features is None:
+				new_det_features = self.reid_network.test_rois(
+					blob['img'], new_det_pos).data
+
+			inactive_tracks = self.inactive_tracks
+			if len(inactive_tracks) >= 1:
+				# calculate appearance distances between the mean track and all detection features
+				inactive = slots_of(inactive_tracks)
+				dist_mat = torch.cdist(self.bank.mean_features(inactive), new_det_features)
+				pos = self.bank.pos[inactive]
 
 				# calculate IoU distances
 				iou = bbox_overlaps(pos, new_det_pos)
@@ -106,9 +101,10 @@ class OracleTracker(Tracker):
 				remove_inactive = []
 				for r,c in zip(row_ind, col_ind):
 					if dist_mat[r,c] <= self.reid_sim_threshold:
+						t = inactive_tracks[r]
 						###### ADD GT ID ######
 						gt = blob['gt']
-						boxes = torch.cat(list(gt.values()), 0).cuda()
+						boxes = torch.cat(list(gt.values()), 0).to(self.device)
 						# boxes = clip_boxes(Variable(boxes), blob['im_info'][0][:2]).data
 						tracks_iou = bbox_overlaps(t.pos, boxes).cpu().numpy()
 						ind = np.where(tracks_iou==np.max(tracks_iou))[1]
@@ -119,11 +115,9 @@ class OracleTracker(Tracker):
 								gt_id = list(gt.keys())[ind]
 								t.gt_id = gt_id
 								if self.pos_oracle:
-									t.pos = gt[gt_id].cuda()
+									t.pos = gt[gt_id].to(self.device)
 							elif self.kill_oracle:
 								continue
-						t = self.inactive_tracks[r]
-						self.tracks.append(t)
 						t.count_inactive = 0
 						t.reset_last_pos()
 						t.pos = new_det_pos[c].view(1,-1)
@@ -131,22 +125,21 @@ class OracleTracker(Tracker):
 						assigned.append(c)
 						remove_inactive.append(t)
 
-				for t in remove_inactive:
-					self.inactive_tracks.remove(t)
+				self.bank.activate(slots_of(remove_inactive))
 
-				keep = torch.Tensor([i for i in range(new_det_pos.size(0)) if i not in assigned]).long().cuda()
+				keep = torch.tensor([i for i in range(new_det_pos.size(0)) if i not in assigned], dtype=torch.long, device=self.device)
 				if keep.nelement() > 0:
 					new_det_pos = new_det_pos[keep]
 					new_det_scores = new_det_scores[keep]
 					new_det_features = new_det_features[keep]
 				else:
-					new_det_pos = torch.zeros(0).cuda()
-					new_det_scores = torch.zeros(0).cuda()
-					new_det_features = torch.zeros(0).cuda()
+					new_det_pos = torch.zeros(0, device=self.device)
+					new_det_scores = torch.zeros(0, device=self.device)
+					new_det_features = torch.zeros(0, device=self.device)
 
 			if len(self.inactive_tracks) >= 1 and self.reid_oracle:
 				gt = blob['gt']
-				gt_pos = torch.cat(list(gt.values()), 0).cuda()
+				gt_pos = torch.cat(list(gt.values()), 0).to(self.device)
 				gt_ids = list(gt.keys())
 
 				# calculate IoU distances
@@ -161,33 +154,31 @@ class OracleTracker(Tracker):
 						gt_id = gt_ids[c]
 
 						# loop through inactive in inversed order to get newest dead track
-						for i in range(len(self.inactive_tracks) - 1, -1, -1):
-							t = self.inactive_tracks[i]
+						for t in reversed(self.inactive_tracks):
 							if t.gt_id == gt_id:
 								if self.pos_oracle:
 									t.pos = gt_pos[c].view(1, -1)
 								else:
 									t.pos = new_det_pos[r, :].view(1, -1)
-								self.inactive_tracks.remove(t)
-								self.tracks.append(t)
+								self.bank.activate(slots_of([t]))
 								t.reset_last_pos()
 								assigned.append(r)
 
-				keep = torch.Tensor([i for i in range(new_det_pos.size(0)) if i not in assigned]).long().cuda()
+				keep = torch.tensor([i for i in range(new_det_pos.size(0)) if i not in assigned], dtype=torch.long, device=self.device)
 				if keep.nelement() > 0:
 					new_det_pos = new_det_pos[keep]
 					new_det_scores = new_det_scores[keep]
 					new_det_features = new_det_features[keep]
 				else:
-					new_det_pos = torch.zeros(0).cuda()
-					new_det_scores = torch.zeros(0).cuda()
-					new_det_features = torch.zeros(0).cuda()
+					new_det_pos = torch.zeros(0, device=self.device)
+					new_det_scores = torch.zeros(0, device=self.device)
+					new_det_features = torch.zeros(0, device=self.device)
 
 		return new_det_pos, new_det_scores, new_det_features
 
 	def oracle(self, blob):
 		gt = blob['gt']
-		boxes = torch.cat(list(gt.values()), 0).cuda()
+		boxes = torch.cat(list(gt.values()), 0).to(self.device)
 		ids = list(gt.keys())
 		# boxes = clip_boxes(Variable(boxes), blob['im_info'][0][:2]).data
 
@@ -195,7 +186,7 @@ class OracleTracker(Tracker):
 		if self.pos_oracle:
 			for t in self.tracks:
 				if t.gt_id in gt.keys():
-					new_pos = gt[t.gt_id].cuda()
+					new_pos = gt[t.gt_id].to(self.device)
 					if self.pos_oracle_center_only:
 						# extract center coordinates of track
 						x1t = t.pos[0, 0]
@@ -226,7 +217,8 @@ class OracleTracker(Tracker):
 		for t in self.tracks:
 			t.pos = clip_boxes_to_image(t.pos, blob['img'].shape[-2:])
 
-		if len(self.tracks):
+		tracks = self.tracks
+		if len(tracks):
 			pos = self.get_pos()
 
 			# calculate IoU distances
@@ -239,19 +231,20 @@ class OracleTracker(Tracker):
 			# normal matching
 			for r, c in zip(row_ind, col_ind):
 				if dist_mat[r, c] <= 0.5:
-					t = self.tracks[r]
+					t = tracks[r]
 					matched.append(t)
 					t.gt_id = ids[c]
 
 			if self.kill_oracle:
-				self.tracks_to_inactive([t for t in self.tracks if t not in matched])
+				self.tracks_to_inactive(slots_of([t for t in tracks if t not in matched]))
 
 	def nms_oracle(self, blob, person_scores):
 		gt = blob['gt']
-		boxes = torch.cat(list(gt.values()), 0).cuda()
+		boxes = torch.cat(list(gt.values()), 0).to(self.device)
 		ids = list(gt.keys())
 
-		if len(self.tracks):
+		tracks = self.tracks
+		if len(tracks):
 			pos = self.get_pos()
 
 			# calculate IoU distances
@@ -300,8 +293,8 @@ class OracleTracker(Tracker):
 
 				gt_ids = np.array(gt_ids)
 
-				track0 = self.tracks[t0]
-				track1 = self.tracks[t1]
+				track0 = tracks[t0]
+				track1 = tracks[t1]
 				unm = [track0, track1]
 				unm_index = [t0, t1]
 
@@ -314,7 +307,7 @@ class OracleTracker(Tracker):
 							unm.remove(t)
 							matched.append(t)
 
-							ind = self.tracks.index(t)
+							ind = tracks.index(t)
 							matched_index.append(ind)
 							unm_index.remove(ind)
 
@@ -331,39 +324,45 @@ class OracleTracker(Tracker):
 						visibility_index += [t0]
 
 			# Remove unmatched NMS tracks
+			removed = []
 			for t in unmatched + visibility:
-				if (t not in matched or t in visibility) and t in self.tracks:
-					self.tracks.remove(t)
-					self.inactive_tracks.append(t)
+				if (t not in matched or t in visibility) and t not in removed:
+					removed.append(t)
+			self.bank.deactivate(slots_of(removed))
 
 			index_remove = []
 			for i in unmatched_index + visibility_index:
 				if i not in matched_index or i in visibility_index:
 					index_remove.append(i)
 
-			keep = torch.Tensor([i for i in range(person_scores.size(0)) if i not in index_remove]).long().cuda()
+			keep = torch.tensor([i for i in range(person_scores.size(0)) if i not in index_remove], dtype=torch.long, device=self.device)
 
 			return person_scores[keep]
 
-	def step(self, blob):
-		for t in self.tracks:
-			# add current position to last_pos list
-			t.last_pos.append(t.pos.clone())
+	def step(self, blob, load_image=True):
+		# active tracks which get new appearance features
+		refresh = torch.zeros(0, dtype=torch.long)
+
+		# add current position to last_pos list
+		self.bank.push_last_pos(self.bank.active())
+		if self.motion_model_cfg['enabled']:
+			self.motion_model.update(self.bank.active())
 
 		###########################
 		# Look for new detections #
 		###########################
 
-		self.obj_detect.load_image(blob['img'])
+		if load_image:
+			self.obj_detect.load_image(blob['img'], blob.get('img_path'))
 
 		if self.public_detections:
 			dets = blob['dets'].squeeze(dim=0)
 			if dets.nelement() > 0:
 				boxes, scores = self.obj_detect.predict_boxes(dets)
 			else:
-				boxes = scores = torch.zeros(0).cuda()
+				boxes = scores = torch.zeros(0, device=self.device)
 		else:
-			boxes, scores = self.obj_detect.detect(blob['img'])
+			boxes, scores = self.obj_detect.detect_loaded_image()
 
 		if boxes.nelement() > 0:
 			boxes = clip_boxes_to_image(boxes, blob['img'].shape[-2:])
@@ -373,7 +372,7 @@ class OracleTracker(Tracker):
 
 			if self.kill_oracle:
 				gt = blob['gt']
-				gt_boxes = torch.cat(list(gt.values()), 0).cuda()
+				gt_boxes = torch.cat(list(gt.values()), 0).to(self.device)
 
 				# calculate IoU distances
 				iou_neg = 1 - bbox_overlaps(boxes, gt_boxes)
@@ -387,28 +386,26 @@ class OracleTracker(Tracker):
 					if dist_mat[r, c] <= 0.5:
 						matched.append(r.item())
 
-				inds = torch.LongTensor(matched).cuda()
+				inds = torch.tensor(matched, dtype=torch.long, device=self.device)
 			else:
 				# Filter out tracks that have too low person score
 				inds = torch.gt(scores, self.detection_person_thresh).nonzero().view(-1)
 		else:
-			inds = torch.zeros(0).cuda()
+			inds = torch.zeros(0, device=self.device)
 
 		if inds.nelement() > 0:
 			det_pos = boxes[inds]
 
 			det_scores = scores[inds]
 		else:
-			det_pos = torch.zeros(0).cuda()
-			det_scores = torch.zeros(0).cuda()
+			det_pos = torch.zeros(0, device=self.device)
+			det_scores = torch.zeros(0, device=self.device)
 
 		##################
 		# Predict tracks #
 		##################
 
-		num_tracks = 0
-		nms_inp_reg = torch.zeros(0).cuda()
-		if len(self.tracks):
+		if len(self.bank.active()):
 			# align
 			if self.do_align:
 				self.align(blob)
@@ -416,38 +413,35 @@ class OracleTracker(Tracker):
 				self.oracle(blob)
 			elif self.motion_model_cfg['enabled']:
 				self.motion()
+				active = self.bank.active()
+				positive = self.bank.has_positive_area(active)
 				if self.reid_oracle:
-					self.tracks_to_inactive([t for t in self.tracks if not t.has_positive_area()])
+					self.tracks_to_inactive(active[~positive])
 				else:
-					self.tracks = [t for t in self.tracks if t.has_positive_area()]
+					self.bank.remove(active[~positive])
 
 			# regress
-			if len(self.tracks):
+			if len(self.bank.active()):
 				person_scores = self.regress_tracks(blob)
 				# now NMS step
 				if self.kill_oracle:
 					person_scores = self.nms_oracle(blob, person_scores)
 
-			if len(self.tracks):
-				# create nms input
-
-
+			active = self.bank.active()
+			if len(active):
 				# nms here if tracks overlap
-				nms_inp_reg = torch.cat((self.get_pos(), person_scores.add_(3).view(-1, 1)), 1)
 				if self.kill_oracle:
 					# keep all
-					keep = torch.arange(nms_inp_reg.size(0)).long().cuda()
+					keep = torch.arange(len(active), device=self.device)
 				else:
-					keep = nms(nms_inp_reg, self.regression_nms_thresh)
+					keep = nms(self.bank.pos[active], person_scores, self.regression_nms_thresh)
 
-				# Plot the killed tracks for debugging
-				self.tracks_to_inactive([self.tracks[i] for i in list(range(len(self.tracks))) if i not in keep])
+				killed = torch.ones(len(active), dtype=torch.bool)
+				killed[keep.cpu()] = False
+				self.tracks_to_inactive(active[killed])
 
 				if keep.nelement() > 0 and self.do_reid:
-					nms_inp_reg = nms_inp_reg[keep]
-					new_features = self.get_appearances(blob)
-					self.add_features(new_features)
-					num_tracks = nms_inp_reg.size(0)
+					refresh = self.refresh_slots()
 
 		#####################
 		# Create new tracks #
@@ -459,25 +453,22 @@ class OracleTracker(Tracker):
 			det_scores = det_scores[keep]
 
 			# check with every track in a single run (problem if tracks delete each other)
-			for t in self.tracks:
-				nms_track_pos = torch.cat([t.pos, det_pos])
-				nms_track_scores = torch.cat(
-					[torch.tensor([2.0]).to(det_scores.device), det_scores])
-				keep = nms(nms_track_pos, nms_track_scores, self.detection_nms_thresh)
+			det_pos, det_scores = self.filter_covered_detections(det_pos, det_scores)
 
-				keep = keep[torch.ge(keep, 1)] - 1
-
-				det_pos = det_pos[keep]
-				det_scores = det_scores[keep]
-				if keep.nelement() == 0:
-					break
+		# one reid forward pass for the refreshed tracks and the new detections
+		det_features = None
+		if self.do_reid:
+			refresh_features, det_features = self.embed(blob, [self.bank.pos[refresh], det_pos])
+			if len(refresh):
+				self.bank.add_features(refresh, refresh_features)
 
 		if det_pos.nelement() > 0:
 			new_det_pos = det_pos
 			new_det_scores = det_scores
 
 			# try to reidentify tracks
-			new_det_pos, new_det_scores, new_det_features = self.reid(blob, new_det_pos, new_det_scores)
+			new_det_pos, new_det_scores, new_det_features = self.reid(
+				blob, new_det_pos, new_det_scores, det_features)
 
 			# add new
 			if new_det_pos.nelement() > 0:
@@ -487,19 +478,19 @@ class OracleTracker(Tracker):
 		# Generate Results #
 		####################
 
-		for t in self.tracks:
-			if t.id not in self.results.keys():
-				self.results[t.id] = {}
-			self.results[t.id][self.im_index] = np.concatenate(
-				[t.pos[0].cpu().numpy(), np.array([t.score])])
+		active = self.bank.active()
+		if len(active):
+			# one transfer for the boxes and scores of all active tracks
+			boxes = torch.cat([self.bank.pos[active], self.bank.score[active].view(-1, 1)], 1).cpu().numpy()
+			self.results.append(self.im_index, self.bank.ids[active].numpy(), boxes)
 
-		for t in self.inactive_tracks:
-			t.count_inactive += 1
+		inactive = self.bank.inactive()
+		self.bank.count_inactive[inactive] += 1
 
 		if not self.reid_oracle:
-			self.inactive_tracks = [
-				t for t in self.inactive_tracks if t.has_positive_area() and t.count_inactive <= self.inactive_patience
-			]
+			dead = ~self.bank.has_positive_area(inactive) | torch.gt(self.bank.count_inactive[inactive], self.inactive_patience)
+			self.bank.remove(inactive[dead])
 
 		self.im_index += 1
-		self.last_image = blob['img'][0]
+		if self.do_align:
+			self.aligner.next_frame(blob['img'][0])
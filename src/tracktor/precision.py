@@ -0,0 +1,82 @@
+from collections import OrderedDict
+
+import torch
+import torch.nn as nn
+
+
+PRECISIONS = {'fp32': None, 'bf16': torch.bfloat16}
+
+
+def to_float(outputs):
+    """Converts the floating point tensors of (nested) module outputs to float32."""
+    if isinstance(outputs, torch.Tensor):
+        return outputs.float() if outputs.is_floating_point() else outputs
+    if isinstance(outputs, OrderedDict):
+        return OrderedDict((k, to_float(v)) for k, v in outputs.items())
+    if isinstance(outputs, dict):
+        return {k: to_float(v) for k, v in outputs.items()}
+    if isinstance(outputs, (list, tuple)):
+        return type(outputs)(to_float(v) for v in outputs)
+    return outputs
+
+
+def to_channels_last(x):
+    if isinstance(x, torch.Tensor) and x.dim() == 4:
+        return x.contiguous(memory_format=torch.channels_last)
+    return x
+
+
+class Autocast(nn.Module):
+    """Runs a module under autocast and returns its outputs in float32.
+
+    Everything outside of the wrapped modules, e.g. box decoding and NMS, stays in float32.
+    With dtype None the module runs in float32 and only the memory format is changed.
+    """
+
+    def __init__(self, module, dtype, channels_last=False):
+        super(Autocast, self).__init__()
+        self.module = module
+        self.dtype = dtype
+        self.channels_last = channels_last
+        if channels_last:
+            module.to(memory_format=torch.channels_last)
+
+    def forward(self, *inputs):
+        if self.channels_last:
+            inputs = [to_channels_last(x) for x in inputs]
+        if self.dtype is None:
+            return self.module(*inputs)
+        # the device of the first input tensor, e.g. the RPN head takes a list of feature maps
+        x = inputs[0]
+        while isinstance(x, (list, tuple)):
+            x = x[0]
+        with torch.autocast(x.device.type, dtype=self.dtype):
+            outputs = self.module(*inputs)
+        return to_float(outputs)
+
+
+def set_inference_precision(obj_detect, reid_network, precision, channels_last=False):
+    """Runs the convolutional and fully connected parts of the detector and the reid network
+    in the given precision ('fp32' or 'bf16').
+
+    For the detector these are the backbone, the RPN head and the box head and predictor of
+    the ROI heads. channels_last applies to the backbone, the RPN head and the reid network in
+    any precision. Has to be called after the weights are loaded.
+    """
+    if precision not in PRECISIONS:
+        raise NotImplementedError("Inference precision: {}".format(precision))
+    dtype = PRECISIONS[precision]
+    if dtype is None and not channels_last:
+        return
+    obj_detect.inference_precision = precision
+    obj_detect.channels_last = channels_last
+
+    obj_detect.backbone = Autocast(obj_detect.backbone, dtype, channels_last)
+    obj_detect.rpn.head = Autocast(obj_detect.rpn.head, dtype, channels_last)
+    if dtype is not None:
+        obj_detect.roi_heads.box_head = Autocast(obj_detect.roi_heads.box_head, dtype)
+        obj_detect.roi_heads.box_predictor = Autocast(obj_detect.roi_heads.box_predictor, dtype)
+
+    reid_network.autocast_dtype = dtype
+    if channels_last:
+        reid_network.to(memory_format=torch.channels_last)
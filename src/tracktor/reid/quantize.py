@@ -0,0 +1,46 @@
+import copy
+
+import torch
+from torch.ao.quantization import QConfigMapping, default_dynamic_qconfig, get_default_qconfig
+from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+from .resnet import ResNet
+
+
+def quantize_resnet(model, calibration_batches, backend='x86'):
+    """Returns an int8 copy of a reid ResNet for CPU inference.
+
+    The convolutional trunk is statically quantized with the activation ranges observed on
+    the calibration batches of crops. fc and fc_out are dynamically quantized, bn_fc stays
+    in float.
+
+    Args:
+        model (ResNet): The fp32 reid network with loaded weights
+        calibration_batches (iterable): Batches of crops as returned by ResNet.build_crops
+        backend (string): Quantized engine, e.g. x86 or qnnpack (ARM)
+    """
+    torch.backends.quantized.engine = backend
+    qconfig_mapping = (QConfigMapping()
+                       .set_global(get_default_qconfig(backend))
+                       .set_module_name('fc', default_dynamic_qconfig)
+                       .set_module_name('fc_out', default_dynamic_qconfig)
+                       .set_module_name('bn_fc', None)
+                       .set_module_name('fc_compare', None))
+
+    model = copy.deepcopy(model).cpu().eval()
+    model.exported_forward = None
+    example_inputs = (torch.rand(2, 3, 256, 128),)
+    prepared = prepare_fx(model, qconfig_mapping, example_inputs)
+    with torch.no_grad():
+        for crops in calibration_batches:
+            prepared(crops.cpu())
+    return convert_fx(prepared)
+
+
+def load_quantized(reid_network, path):
+    """Runs test_rois of the reid network with the int8 TorchScript module at path, as
+    written by experiments/scripts/quantize_reid.py. Quantized modules run on the CPU only."""
+    assert isinstance(reid_network, ResNet), "[!] Only the reid ResNet can be quantized"
+    assert next(reid_network.parameters()).device.type == 'cpu', \
+        "[!] The int8 reid network runs on the CPU only"
+    reid_network.exported_forward = torch.jit.load(path, map_location='cpu')
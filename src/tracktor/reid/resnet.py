@@ -6,8 +6,8 @@ import torchvision.models as models
 
 import torch.utils.model_zoo as model_zoo
 from torchvision.models.resnet import Bottleneck
+from torchvision.ops import roi_align
 import torchvision.models as models
-from torchvision.transforms import Resize, Compose, ToPILImage, ToTensor
 
 import numpy as np
 import random
@@ -43,6 +43,11 @@ class ResNet(models.ResNet):
 
         self.fc_compare = nn.Linear(output_dim, 1)
 
+        # autocast dtype of test_rois, see tracktor.precision
+        self.autocast_dtype = None
+        # TorchScript module used by test_rois in place of forward, see tracktor.export
+        self.exported_forward = None
+
     def forward(self, x):
         x = self.conv1(x)
         x = self.bn1(x)
@@ -67,8 +72,19 @@ class ResNet(models.ResNet):
         """Tests the rois on a particular image. Should be inside image."""
         x = self.build_crops(image, rois)
         x = Variable(x)
-        
-        return self.forward(x)
+
+        # the precision and memory format are part of the exported graph
+        if self.exported_forward is not None:
+            return self.exported_forward(x)
+
+        if self.conv1.weight.is_contiguous(memory_format=torch.channels_last):
+            x = x.contiguous(memory_format=torch.channels_last)
+        if self.autocast_dtype is None:
+            return self.forward(x)
+
+        with torch.autocast(x.device.type, dtype=self.autocast_dtype):
+            x = self.forward(x)
+        return x.float()
 
     def compare(self, e0, e1, train=False):
         out = torch.abs(e0 - e1)
@@ -78,29 +94,24 @@ class ResNet(models.ResNet):
         return out
 
     def build_crops(self, image, rois):
-        res = []
-        trans = Compose([ToPILImage(), Resize((256,128)), ToTensor()])
-        for r in rois:
-            x0 = int(r[0])
-            y0 = int(r[1])
-            x1 = int(r[2])
-            y1 = int(r[3])
-            if x0 == x1:
-                if x0 != 0:
-                    x0 -= 1
-                else:
-                    x1 += 1
-            if y0 == y1:
-                if y0 != 0:
-                    y0 -= 1
-                else:
-                    y1 += 1
-            im = image[0,:,y0:y1,x0:x1]
-            im = trans(im)
-            res.append(im)
-        res = torch.stack(res, 0)
-        res = res.cuda()
-        return res
+        """Crops the rois from the image resized to 256x128 in one batched roi_align on the
+        device of the network. Boxes are cut at full pixels and have at least a size of 1."""
+        device = next(self.parameters()).device
+        image = image[:1].to(device)
+        rois = rois.to(device).long()
+        x0, y0, x1, y1 = rois.unbind(dim=1)
+        # widen empty boxes to the left or top, at the image border to the right or bottom
+        x0 = torch.where((x0 == x1) & (x0 != 0), x0 - 1, x0)
+        x1 = torch.where(x0 == x1, x1 + 1, x1)
+        y0 = torch.where((y0 == y1) & (y0 != 0), y0 - 1, y0)
+        y1 = torch.where(y0 == y1, y1 + 1, y1)
+
+        batch_index = torch.zeros_like(x0)
+        boxes = torch.stack([batch_index, x0, y0, x1, y1], dim=1).to(image.dtype)
+        # aligned samples at the pixel centers like a resize, the adaptive sampling ratio
+        # averages over the pixels of a bin when downscaling
+        return roi_align(image, boxes, output_size=(256, 128), spatial_scale=1.0,
+                         sampling_ratio=-1, aligned=True)
 
     def sum_losses(self, batch, loss, margin, prec_at_k):
         """For Pretraining
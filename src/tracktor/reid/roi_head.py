@@ -0,0 +1,52 @@
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+
+class RoIEmbeddingHead(nn.Module):
+    """Lightweight appearance embedding on the pooled FPN features of boxes.
+
+    Two fully connected layers as in the box head of the detector, trained to reproduce the
+    embeddings of the reid ResNet with experiments/scripts/train_roi_reid.py.
+    """
+
+    def __init__(self, output_dim, in_channels=256, resolution=7, representation_size=1024):
+        super(RoIEmbeddingHead, self).__init__()
+        self.fc6 = nn.Linear(in_channels * resolution ** 2, representation_size)
+        self.fc_out = nn.Linear(representation_size, output_dim)
+
+    def forward(self, x):
+        x = x.flatten(start_dim=1)
+        x = F.relu(self.fc6(x))
+        x = self.fc_out(x)
+        return x
+
+
+class RoIReID(nn.Module):
+    """Reid network for the tracker that embeds boxes with a RoIEmbeddingHead on the features
+    of the detector instead of running a separate CNN on image crops.
+
+    The features are the ones of the image last given to FRCNN_FPN.load_image, which is the
+    current frame whenever the tracker calls test_rois.
+    """
+
+    def __init__(self, obj_detect, head):
+        super(RoIReID, self).__init__()
+        # bound method, so the shared detector is not registered as submodule
+        self.roi_features = obj_detect.roi_features
+        self.head = head
+        # autocast dtype of test_rois, see tracktor.precision
+        self.autocast_dtype = None
+
+    def forward(self, box_features):
+        return self.head(box_features)
+
+    def test_rois(self, image, rois):
+        """Embeds the rois of the current frame, the image itself is not needed."""
+        _, box_features = self.roi_features(rois)
+        if self.autocast_dtype is None:
+            return self.forward(box_features)
+
+        with torch.autocast(box_features.device.type, dtype=self.autocast_dtype):
+            x = self.forward(box_features)
+        return x.float()
@@ -0,0 +1,88 @@
+import numpy as np
+
+
+class ResultsBuffer(object):
+	"""Growable columnar storage of the tracking results.
+
+	Every row holds the frame, the track id and the box with score (x1, y1, x2, y2, score)
+	of one track in one frame. Rows are appended frame by frame. If a stream file is set,
+	the rows are appended to it whenever flush_rows are buffered, which keeps the memory
+	flat on long sequences. The file is raw ROW_DTYPE records and can be read with
+	np.fromfile.
+	"""
+
+	ROW_DTYPE = np.dtype([('frame', np.int64), ('id', np.int64), ('box', np.float32, 5)])
+
+	def __init__(self, capacity=1024, flush_rows=65536):
+		self.init_capacity = capacity
+		self.flush_rows = flush_rows
+		self.stream_path = None
+		self.reset()
+
+	def reset(self):
+		"""Removes all results and stops streaming."""
+		self.rows = np.zeros(self.init_capacity, dtype=self.ROW_DTYPE)
+		self.num_rows = 0
+		self.num_streamed = 0
+		self.stream_path = None
+
+	def stream(self, stream_path):
+		"""Streams all following results to stream_path, an existing file is overwritten."""
+		self.stream_path = stream_path
+		open(self.stream_path, 'wb').close()
+		self.flush()
+
+	def __len__(self):
+		return self.num_streamed + self.num_rows
+
+	def append(self, frame, ids, boxes):
+		"""Adds the results of one frame.
+
+		Args:
+			frame (int): Frame index
+			ids (np.array): Track ids of shape (N,)
+			boxes (np.array): Boxes with scores of shape (N, 5)
+		"""
+		num = len(ids)
+		if self.num_rows + num > len(self.rows):
+			rows = np.zeros(max(2 * len(self.rows), self.num_rows + num), dtype=self.ROW_DTYPE)
+			rows[:self.num_rows] = self.rows[:self.num_rows]
+			self.rows = rows
+
+		new = self.rows[self.num_rows:self.num_rows + num]
+		new['frame'] = frame
+		new['id'] = ids
+		new['box'] = boxes
+		self.num_rows += num
+
+		if self.stream_path is not None and self.num_rows >= self.flush_rows:
+			self.flush()
+
+	def flush(self):
+		"""Writes the buffered rows to the stream file."""
+		if self.stream_path is None or not self.num_rows:
+			return
+		with open(self.stream_path, 'ab') as f:
+			self.rows[:self.num_rows].tofile(f)
+		self.num_streamed += self.num_rows
+		self.num_rows = 0
+
+	def as_array(self):
+		"""All rows, including the streamed ones."""
+		rows = self.rows[:self.num_rows]
+		if self.num_streamed:
+			rows = np.concatenate([np.fromfile(self.stream_path, dtype=self.ROW_DTYPE), rows])
+		return rows
+
+	def as_dict(self):
+		"""The results as {id: {frame: np.array([x1, y1, x2, y2, score])}}.
+
+		Tracks and frames are in the order they were added.
+		"""
+		results = {}
+		rows = self.as_array()
+		for track_id, frame, box in zip(rows['id'].tolist(), rows['frame'].tolist(), rows['box']):
+			if track_id not in results:
+				results[track_id] = {}
+			results[track_id][frame] = box
+		return results
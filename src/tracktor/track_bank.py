@@ -0,0 +1,263 @@
+import torch
+
+
+class TrackBank(object):
+	"""Structure-of-arrays storage for all active and inactive tracks of a Tracker.
+
+	Every track occupies one slot of a set of preallocated tensors which grow on demand.
+	Positions, scores, position histories and appearance features live on the tracker
+	device. The bookkeeping (ids, states, ordering, counters) stays on the host, so
+	selecting tracks never has to wait for the device.
+	"""
+
+	FREE = 0
+	ACTIVE = 1
+	INACTIVE = 2
+
+	def __init__(self, max_features_num, mm_steps, device, capacity=64):
+		self.max_features_num = max_features_num
+		self.hist_size = mm_steps + 1
+		self.device = device
+		self.init_capacity = capacity
+		self.reset()
+
+	def reset(self):
+		"""Removes all tracks."""
+		self.capacity = 0
+		self.pos = torch.zeros(0, 4, device=self.device)
+		self.score = torch.zeros(0, device=self.device)
+		# position history, the most recent entry is at the end
+		self.last_pos = torch.zeros(0, self.hist_size, 4, device=self.device)
+		self.last_v = torch.zeros(0, 4, device=self.device)
+		# appearance features ring buffer and its running sum, allocated once the feature size is known
+		self.features = None
+		self.features_sum = None
+		# box and score at the last added features, to decide when to refresh them
+		self.features_pos = torch.zeros(0, 4, device=self.device)
+		self.features_score = torch.zeros(0, device=self.device)
+
+		self.ids = torch.zeros(0, dtype=torch.long)
+		self.state = torch.zeros(0, dtype=torch.uint8)
+		self.order = torch.zeros(0, dtype=torch.long)
+		self.count_inactive = torch.zeros(0, dtype=torch.long)
+		self.last_pos_len = torch.zeros(0, dtype=torch.long)
+		self.last_v_len = torch.zeros(0, dtype=torch.long)
+		self.features_num = torch.zeros(0, dtype=torch.long)
+		self.features_head = torch.zeros(0, dtype=torch.long)
+		# frames since the last added features
+		self.features_age = torch.zeros(0, dtype=torch.long)
+		self.gt_id = []
+
+		self.next_order = 0
+		self._grow(self.init_capacity)
+
+	def _grow(self, capacity):
+		def pad(t):
+			return torch.cat([t, t.new_zeros((capacity - self.capacity,) + t.shape[1:])])
+
+		self.pos = pad(self.pos)
+		self.score = pad(self.score)
+		self.last_pos = pad(self.last_pos)
+		self.last_v = pad(self.last_v)
+		if self.features is not None:
+			self.features = pad(self.features)
+			self.features_sum = pad(self.features_sum)
+		self.features_pos = pad(self.features_pos)
+		self.features_score = pad(self.features_score)
+
+		self.ids = pad(self.ids)
+		self.state = pad(self.state)
+		self.order = pad(self.order)
+		self.count_inactive = pad(self.count_inactive)
+		self.last_pos_len = pad(self.last_pos_len)
+		self.last_v_len = pad(self.last_v_len)
+		self.features_num = pad(self.features_num)
+		self.features_head = pad(self.features_head)
+		self.features_age = pad(self.features_age)
+		self.gt_id += [None] * (capacity - self.capacity)
+
+		self.capacity = capacity
+
+	def _with_state(self, state):
+		slots = torch.eq(self.state, state).nonzero().view(-1)
+		return slots[self.order[slots].argsort()]
+
+	def active(self):
+		"""Slots of all active tracks in the order they became active."""
+		return self._with_state(self.ACTIVE)
+
+	def inactive(self):
+		"""Slots of all inactive tracks in the order they became inactive."""
+		return self._with_state(self.INACTIVE)
+
+	def _set_state(self, slots, state):
+		self.state[slots] = state
+		self.order[slots] = torch.arange(self.next_order, self.next_order + len(slots))
+		self.next_order += len(slots)
+
+	def add(self, pos, score, ids, features):
+		"""Creates new active tracks and returns their slots."""
+		num_new = pos.size(0)
+		free = torch.eq(self.state, self.FREE).nonzero().view(-1)
+		if len(free) < num_new:
+			self._grow(max(2 * self.capacity, self.capacity + num_new - len(free)))
+			free = torch.eq(self.state, self.FREE).nonzero().view(-1)
+		slots = free[:num_new]
+
+		self.pos[slots] = pos
+		self.score[slots] = score
+		self.ids[slots] = ids
+		self.count_inactive[slots] = 0
+		self.last_v_len[slots] = 0
+		self.features_num[slots] = 0
+		self.features_head[slots] = 0
+		self.features_age[slots] = 0
+		if self.features is not None:
+			self.features_sum[slots] = 0
+		for s in slots.tolist():
+			self.gt_id[s] = None
+		self.reset_last_pos(slots)
+		if isinstance(features, torch.Tensor) and features.nelement() > 0:
+			self.add_features(slots, features.view(num_new, -1))
+		self._set_state(slots, self.ACTIVE)
+		return slots
+
+	def activate(self, slots):
+		"""Makes inactive tracks active again."""
+		self.count_inactive[slots] = 0
+		self._set_state(slots, self.ACTIVE)
+
+	def deactivate(self, slots):
+		"""Makes active tracks inactive, they are appended to the inactive ones in the given order."""
+		self._set_state(slots, self.INACTIVE)
+
+	def remove(self, slots):
+		"""Deletes tracks and frees their slots."""
+		self.state[slots] = self.FREE
+
+	def has_positive_area(self, slots):
+		pos = self.pos[slots]
+		return ((pos[:, 2] > pos[:, 0]) & (pos[:, 3] > pos[:, 1])).cpu()
+
+	def push_last_pos(self, slots):
+		"""Appends the current positions to the position histories."""
+		self.last_pos[slots] = torch.cat([self.last_pos[slots, 1:], self.pos[slots].unsqueeze(1)], 1)
+		self.last_pos_len[slots] = (self.last_pos_len[slots] + 1).clamp(max=self.hist_size)
+
+	def reset_last_pos(self, slots):
+		"""Restarts the position histories with the current positions."""
+		self.last_pos[slots, -1] = self.pos[slots]
+		self.last_pos_len[slots] = 1
+
+	def add_features(self, slots, features):
+		"""Adds new appearance features, the oldest ones are dropped after max_features_num.
+
+		The running sum is updated with the new and the dropped features, which keeps the
+		cost independent of max_features_num.
+		"""
+		if self.features is None:
+			self.features = features.new_zeros(self.capacity, self.max_features_num, features.size(1))
+			self.features_sum = features.new_zeros(self.capacity, features.size(1))
+		head = self.features_head[slots]
+		full = torch.eq(self.features_num[slots], self.max_features_num).to(features)
+		self.features_sum[slots] += features - self.features[slots, head] * full.view(-1, 1)
+		self.features[slots, head] = features
+		self.features_head[slots] = (head + 1) % self.max_features_num
+		self.features_num[slots] = (self.features_num[slots] + 1).clamp(max=self.max_features_num)
+		self.features_pos[slots] = self.pos[slots]
+		self.features_score[slots] = self.score[slots]
+		self.features_age[slots] = 0
+
+	def mean_features(self, slots):
+		"""Average over the stored appearance features of each track."""
+		num = self.features_num[slots].view(-1, 1).to(self.features_sum)
+		return self.features_sum[slots] / num
+
+
+class Track(object):
+	"""A view on one track of a TrackBank.
+
+	It allows to treat single tracks as objects, e.g. for the oracle tracker. The data
+	stays in the bank.
+	"""
+
+	def __init__(self, bank, slot):
+		self.bank = bank
+		self.slot = slot
+
+	def __eq__(self, other):
+		return isinstance(other, Track) and self.bank is other.bank and self.slot == other.slot
+
+	def __hash__(self):
+		return hash(self.slot)
+
+	@property
+	def id(self):
+		return self.bank.ids[self.slot].item()
+
+	@property
+	def pos(self):
+		return self.bank.pos[self.slot:self.slot + 1]
+
+	@pos.setter
+	def pos(self, pos):
+		self.bank.pos[self.slot] = pos.view(-1)
+
+	@property
+	def score(self):
+		return self.bank.score[self.slot]
+
+	@score.setter
+	def score(self, score):
+		self.bank.score[self.slot] = score
+
+	@property
+	def count_inactive(self):
+		return self.bank.count_inactive[self.slot].item()
+
+	@count_inactive.setter
+	def count_inactive(self, count_inactive):
+		self.bank.count_inactive[self.slot] = count_inactive
+
+	@property
+	def gt_id(self):
+		return self.bank.gt_id[self.slot]
+
+	@gt_id.setter
+	def gt_id(self, gt_id):
+		self.bank.gt_id[self.slot] = gt_id
+
+	@property
+	def last_pos(self):
+		"""Position history as (1, 4) views, the most recent one last."""
+		num = self.bank.last_pos_len[self.slot].item()
+		return [p.view(1, -1) for p in self.bank.last_pos[self.slot, self.bank.hist_size - num:]]
+
+	@property
+	def last_v(self):
+		return self.bank.last_v[self.slot, :self.bank.last_v_len[self.slot].item()]
+
+	@last_v.setter
+	def last_v(self, last_v):
+		self.bank.last_v[self.slot, :last_v.nelement()] = last_v
+		self.bank.last_v_len[self.slot] = last_v.nelement()
+
+	def has_positive_area(self):
+		return self.pos[0, 2] > self.pos[0, 0] and self.pos[0, 3] > self.pos[0, 1]
+
+	def add_features(self, features):
+		"""Adds new appearance features to the object."""
+		self.bank.add_features(torch.tensor([self.slot]), features.view(1, -1))
+
+	def test_features(self, test_features):
+		"""Compares test_features to features of this Track object"""
+		features = self.bank.mean_features(torch.tensor([self.slot]))
+		return torch.cdist(features, test_features).view(-1, 1)
+
+	def reset_last_pos(self):
+		self.bank.reset_last_pos(torch.tensor([self.slot]))
+
+
+def slots_of(tracks):
+	"""Slots of a list of Track objects."""
+	return torch.tensor([t.slot for t in tracks], dtype=torch.long)
@@ -1,15 +1,14 @@
-from collections import deque
-
-import numpy as np
 import torch
-import torch.nn.functional as F
 from torch.autograd import Variable
 from scipy.optimize import linear_sum_assignment
-import cv2
 
-from .utils import bbox_overlaps, warp_pos, get_center, get_height, get_width, make_pos
+from .alignment import build_aligner
+from .motion import build_motion_model
+from .results import ResultsBuffer
+from .track_bank import TrackBank, Track
+from .utils import bbox_overlaps, box_ioa, paired_box_iou, warp_boxes
 
-from torchvision.ops.boxes import clip_boxes_to_image, nms
+from torchvision.ops.boxes import box_iou, clip_boxes_to_image, nms
 
 
 class Tracker:
@@ -31,120 +30,107 @@ class Tracker:
 		self.reid_sim_threshold = tracker_cfg['reid_sim_threshold']
 		self.reid_iou_threshold = tracker_cfg['reid_iou_threshold']
 		self.do_align = tracker_cfg['do_align']
+		self.appearance_refresh = tracker_cfg['appearance_refresh']
 		self.motion_model_cfg = tracker_cfg['motion_model']
+		self.device = torch.device(tracker_cfg['device'])
 
-		self.warp_mode = eval(tracker_cfg['warp_mode'])
-		self.number_of_iterations = tracker_cfg['number_of_iterations']
-		self.termination_eps = tracker_cfg['termination_eps']
+		self.aligner = build_aligner(tracker_cfg)
 
-		self.tracks = []
-		self.inactive_tracks = []
+		self.bank = TrackBank(
+			self.max_features_num,
+			self.motion_model_cfg['n_steps'] if self.motion_model_cfg['n_steps'] > 0 else 1,
+			self.device)
+		self.motion_model = build_motion_model(self.motion_model_cfg, self.bank)
 		self.track_num = 0
 		self.im_index = 0
-		self.results = {}
+		self.results = ResultsBuffer()
+		self.appearance_counts = {'refreshed': 0, 'not_due': 0, 'occluded': 0}
+
+	@property
+	def tracks(self):
+		"""Active tracks in the order they became active."""
+		return [Track(self.bank, s) for s in self.bank.active().tolist()]
+
+	@property
+	def inactive_tracks(self):
+		"""Inactive tracks in the order they became inactive."""
+		return [Track(self.bank, s) for s in self.bank.inactive().tolist()]
 
 	def reset(self, hard=True):
-		self.tracks = []
-		self.inactive_tracks = []
+		self.bank.reset()
+		self.motion_model.reset()
 
 		if hard:
 			self.track_num = 0
-			self.results = {}
+			self.results.reset()
 			self.im_index = 0
+			self.aligner.reset()
+			self.appearance_counts = dict.fromkeys(self.appearance_counts, 0)
 
-	def tracks_to_inactive(self, tracks):
-		self.tracks = [t for t in self.tracks if t not in tracks]
-		for t in tracks:
-			t.pos = t.last_pos[-1]
-		self.inactive_tracks += tracks
+	def tracks_to_inactive(self, slots):
+		"""Moves the active tracks in slots to the inactive ones."""
+		self.bank.pos[slots] = self.bank.last_pos[slots, -1]
+		self.bank.deactivate(slots)
 
 	def add(self, new_det_pos, new_det_scores, new_det_features):
-		"""Initializes new Track objects and saves them."""
+		"""Initializes new tracks and returns their slots."""
 		num_new = new_det_pos.size(0)
-		for i in range(num_new):
-			self.tracks.append(Track(
-				new_det_pos[i].view(1, -1),
-				new_det_scores[i],
-				self.track_num + i,
-				new_det_features[i].view(1, -1),
-				self.inactive_patience,
-				self.max_features_num,
-				self.motion_model_cfg['n_steps'] if self.motion_model_cfg['n_steps'] > 0 else 1
-			))
+		slots = self.bank.add(
+			new_det_pos,
+			new_det_scores,
+			torch.arange(self.track_num, self.track_num + num_new),
+			new_det_features)
+		self.motion_model.add(slots)
 		self.track_num += num_new
+		return slots
 
 	def regress_tracks(self, blob):
 		"""Regress the position of the tracks and also checks their scores."""
-		pos = self.get_pos()
+		active = self.bank.active()
 
 		# regress
-		boxes, scores = self.obj_detect.predict_boxes(pos)
+		boxes, scores = self.obj_detect.predict_boxes(self.bank.pos[active])
 		pos = clip_boxes_to_image(boxes, blob['img'].shape[-2:])
 
-		s = []
-		for i in range(len(self.tracks) - 1, -1, -1):
-			t = self.tracks[i]
-			t.score = scores[i]
-			if scores[i] <= self.regression_person_thresh:
-				self.tracks_to_inactive([t])
-			else:
-				s.append(scores[i])
-				# t.prev_pos = t.pos
-				t.pos = pos[i].view(1, -1)
+		self.bank.score[active] = scores
+		alive = torch.gt(scores, self.regression_person_thresh)
+		alive_cpu = alive.cpu()
+		self.bank.pos[active[alive_cpu]] = pos[alive]
+		# killed tracks become inactive in reversed order
+		self.tracks_to_inactive(active[~alive_cpu].flip(0))
 
-		return torch.Tensor(s[::-1]).cuda()
+		return scores[alive]
 
 	def get_pos(self):
 		"""Get the positions of all active tracks."""
-		if len(self.tracks) == 1:
-			pos = self.tracks[0].pos
-		elif len(self.tracks) > 1:
-			pos = torch.cat([t.pos for t in self.tracks], 0)
-		else:
-			pos = torch.zeros(0).cuda()
-		return pos
+		return self.bank.pos[self.bank.active()]
 
 	def get_features(self):
-		"""Get the features of all active tracks."""
-		if len(self.tracks) == 1:
-			features = self.tracks[0].features
-		elif len(self.tracks) > 1:
-			features = torch.cat([t.features for t in self.tracks], 0)
-		else:
-			features = torch.zeros(0).cuda()
-		return features
+		"""Get the mean features of all active tracks."""
+		return self.bank.mean_features(self.bank.active())
 
 	def get_inactive_features(self):
-		"""Get the features of all inactive tracks."""
-		if len(self.inactive_tracks) == 1:
-			features = self.inactive_tracks[0].features
-		elif len(self.inactive_tracks) > 1:
-			features = torch.cat([t.features for t in self.inactive_tracks], 0)
-		else:
-			features = torch.zeros(0).cuda()
-		return features
+		"""Get the mean features of all inactive tracks."""
+		return self.bank.mean_features(self.bank.inactive())
+
+	def reid(self, blob, new_det_pos, new_det_scores, det_features=None):
+		"""Tries to ReID inactive tracks with provided detections.
 
-	def reid(self, blob, new_det_pos, new_det_scores):
-		"""Tries to ReID inactive tracks with provided detections."""
-		new_det_features = [torch.zeros(0).cuda() for _ in range(len(new_det_pos))]
+		The appearance features of the detections are computed unless they are given.
+		"""
+		new_det_features = [torch.zeros(0, device=self.device) for _ in range(len(new_det_pos))]
 
 		if self.do_reid:
-			new_det_features = self.reid_network.test_rois(
-				blob['img'], new_det_pos).data
-
-			if len(self.inactive_tracks) >= 1:
-				# calculate appearance distances
-				dist_mat, pos = [], []
-				for t in self.inactive_tracks:
-					dist_mat.append(torch.cat([t.test_features(feat.view(1, -1))
-					                           for feat in new_det_features], dim=1))
-					pos.append(t.pos)
-				if len(dist_mat) > 1:
-					dist_mat = torch.cat(dist_mat, 0)
-					pos = torch.cat(pos, 0)
-				else:
-					dist_mat = dist_mat[0]
-					pos = pos[0]
+			new_det_features = det_features
+			if new_det_features is None:
+				new_det_features = self.reid_network.test_rois(
+					blob['img'], new_det_pos).data
+
+			inactive = self.bank.inactive()
+			if len(inactive) >= 1:
+				# calculate appearance distances between the mean track and all detection features
+				dist_mat = torch.cdist(self.bank.mean_features(inactive), new_det_features)
+				pos = self.bank.pos[inactive]
 
 				# calculate IoU distances
 				iou = bbox_overlaps(pos, new_det_pos)
@@ -155,119 +141,138 @@ class Tracker:
 				dist_mat = dist_mat.cpu().numpy()
 
 				row_ind, col_ind = linear_sum_assignment(dist_mat)
-
-				assigned = []
-				remove_inactive = []
-				for r, c in zip(row_ind, col_ind):
-					if dist_mat[r, c] <= self.reid_sim_threshold:
-						t = self.inactive_tracks[r]
-						self.tracks.append(t)
-						t.count_inactive = 0
-						t.pos = new_det_pos[c].view(1, -1)
-						t.reset_last_pos()
-						t.add_features(new_det_features[c].view(1, -1))
-						assigned.append(c)
-						remove_inactive.append(t)
-
-				for t in remove_inactive:
-					self.inactive_tracks.remove(t)
-
-				keep = torch.Tensor([i for i in range(new_det_pos.size(0)) if i not in assigned]).long().cuda()
-				if keep.nelement() > 0:
-					new_det_pos = new_det_pos[keep]
-					new_det_scores = new_det_scores[keep]
-					new_det_features = new_det_features[keep]
-				else:
-					new_det_pos = torch.zeros(0).cuda()
-					new_det_scores = torch.zeros(0).cuda()
-					new_det_features = torch.zeros(0).cuda()
+				matched = dist_mat[row_ind, col_ind] <= self.reid_sim_threshold
+				row_ind = torch.from_numpy(row_ind[matched]).long()
+				col_ind = torch.from_numpy(col_ind[matched]).long()
+
+				slots = inactive[row_ind]
+				self.bank.pos[slots] = new_det_pos[col_ind]
+				self.bank.activate(slots)
+				self.bank.reset_last_pos(slots)
+				self.bank.add_features(slots, new_det_features[col_ind])
+
+				keep = torch.ones(new_det_pos.size(0), dtype=torch.bool)
+				keep[col_ind] = False
+				keep = keep.to(self.device)
+				new_det_pos = new_det_pos[keep]
+				new_det_scores = new_det_scores[keep]
+				new_det_features = new_det_features[keep]
 
 		return new_det_pos, new_det_scores, new_det_features
 
-	def get_appearances(self, blob):
-		"""Uses the siamese CNN to get the features for all active tracks."""
-		new_features = self.reid_network.test_rois(blob['img'], self.get_pos()).data
-		return new_features
+	def filter_covered_detections(self, det_pos, det_scores):
+		"""Removes the detections which overlap with an active track.
 
-	def add_features(self, new_features):
-		"""Adds new appearance features to active tracks."""
-		for t, f in zip(self.tracks, new_features):
-			t.add_features(f.view(1, -1))
+		This used to be done by an NMS over each active track (with a score above all
+		detections) and the remaining detections. The detections already went through an NMS
+		with the same threshold, so such an NMS only removes detections whose IoU with the
+		track exceeds detection_nms_thresh. Doing this for all tracks at once gives the same
+		result with one IoU matrix.
+		"""
+		pos = self.get_pos()
+		if pos.nelement() > 0:
+			covered = torch.gt(box_iou(pos, det_pos), self.detection_nms_thresh).any(dim=0)
+			det_pos = det_pos[~covered]
+			det_scores = det_scores[~covered]
+		return det_pos, det_scores
+
+	def embed(self, blob, boxes):
+		"""Appearance features of several sets of boxes of the current frame with a single
+		reid forward pass, returned as one tensor per set."""
+		boxes = [b.view(-1, 4) for b in boxes]
+		sizes = [len(b) for b in boxes]
+		if not sum(sizes):
+			return [torch.zeros(0, device=self.device) for _ in boxes]
+		features = self.reid_network.test_rois(blob['img'], torch.cat(boxes)).data
+		return features.split(sizes)
+
+	def refresh_slots(self):
+		"""Slots of the active tracks which are due for new appearance features.
+
+		Features are refreshed every `every` frames, or earlier if the IoU of the box with the
+		one at the last refresh drops below min_iou or the score changed by more than
+		score_change. Tracks covered by more than max_occlusion of their area by another active
+		track are not refreshed, their crop mostly shows the other track.
+		"""
+		cfg = self.appearance_refresh
+		active = self.bank.active()
+		self.bank.features_age[active] += 1
+
+		pos = self.bank.pos[active]
+		changed = torch.lt(paired_box_iou(pos, self.bank.features_pos[active]), cfg['min_iou'])
+		changed |= torch.gt((self.bank.score[active] - self.bank.features_score[active]).abs(), cfg['score_change'])
+		due = torch.ge(self.bank.features_age[active], cfg['every']) | changed.cpu()
+
+		occluded = torch.zeros(len(active), dtype=torch.bool)
+		if cfg['max_occlusion'] < 1.0:
+			ioa = box_ioa(pos, pos)
+			ioa.fill_diagonal_(0.0)
+			occluded = torch.gt(ioa.max(dim=1)[0], cfg['max_occlusion']).cpu()
+
+		refresh = due & ~occluded
+		self.appearance_counts['refreshed'] += int(refresh.sum())
+		self.appearance_counts['not_due'] += int((~due).sum())
+		self.appearance_counts['occluded'] += int((due & occluded).sum())
+		return active[refresh]
+
+	@property
+	def appearance_skip_rate(self):
+		"""Fraction of the active track appearances which were not refreshed since the last
+		reset."""
+		num = sum(self.appearance_counts.values())
+		return 1.0 - self.appearance_counts['refreshed'] / num if num else 0.0
 
 	def align(self, blob):
 		"""Aligns the positions of active and inactive tracks depending on camera motion."""
-		if self.im_index > 0:
-			im1 = np.transpose(self.last_image.cpu().numpy(), (1, 2, 0))
-			im2 = np.transpose(blob['img'][0].cpu().numpy(), (1, 2, 0))
-			im1_gray = cv2.cvtColor(im1, cv2.COLOR_RGB2GRAY)
-			im2_gray = cv2.cvtColor(im2, cv2.COLOR_RGB2GRAY)
-			warp_matrix = np.eye(2, 3, dtype=np.float32)
-			criteria = (cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, self.number_of_iterations,  self.termination_eps)
-			cc, warp_matrix = cv2.findTransformECC(im1_gray, im2_gray, warp_matrix, self.warp_mode, criteria)
-			warp_matrix = torch.from_numpy(warp_matrix)
-
-			for t in self.tracks:
-				t.pos = warp_pos(t.pos, warp_matrix)
-				# t.pos = clip_boxes(Variable(pos), blob['im_info'][0][:2]).data
+		warp_matrix = self.aligner.estimate(blob['img'][0])
+		if warp_matrix is not None:
+			warp_matrix = torch.from_numpy(warp_matrix).to(self.device)
 
+			# warp all boxes (and position histories) with a single transform
+			slots = self.bank.active()
 			if self.do_reid:
-				for t in self.inactive_tracks:
-					t.pos = warp_pos(t.pos, warp_matrix)
+				slots = torch.cat([slots, self.bank.inactive()])
+			self.bank.pos[slots] = warp_boxes(self.bank.pos[slots], warp_matrix)
+			# self.bank.pos[slots] = clip_boxes(Variable(pos), blob['im_info'][0][:2]).data
 
 			if self.motion_model_cfg['enabled']:
-				for t in self.tracks:
-					for i in range(len(t.last_pos)):
-						t.last_pos[i] = warp_pos(t.last_pos[i], warp_matrix)
-
-	def motion_step(self, track):
-		"""Updates the given track's position by one step based on track.last_v"""
-		if self.motion_model_cfg['center_only']:
-			center_new = get_center(track.pos) + track.last_v
-			track.pos = make_pos(*center_new, get_width(track.pos), get_height(track.pos))
-		else:
-			track.pos = track.pos + track.last_v
+				self.motion_model.warp(slots, warp_matrix)
 
 	def motion(self):
-		"""Applies a simple linear motion model that considers the last n_steps steps."""
-		for t in self.tracks:
-			last_pos = list(t.last_pos)
-
-			# avg velocity between each pair of consecutive positions in t.last_pos
-			if self.motion_model_cfg['center_only']:
-				vs = [get_center(p2) - get_center(p1) for p1, p2 in zip(last_pos, last_pos[1:])]
-			else:
-				vs = [p2 - p1 for p1, p2 in zip(last_pos, last_pos[1:])]
-
-			t.last_v = torch.stack(vs).mean(dim=0)
-			self.motion_step(t)
-
-		if self.do_reid:
-			for t in self.inactive_tracks:
-				if t.last_v.nelement() > 0:
-					self.motion_step(t)
+		"""Applies the motion model to the active tracks and, for reid, the inactive ones."""
+		inactive = self.bank.inactive() if self.do_reid else torch.zeros(0, dtype=torch.long)
+		self.motion_model.predict(self.bank.active(), inactive)
 
-	def step(self, blob):
+	def step(self, blob, load_image=True):
 		"""This function should be called every timestep to perform tracking with a blob
 		containing the image information.
+
+		With load_image=False the features of blob['img'] must already be loaded into
+		obj_detect, e.g. by MultiStreamTracker.
 		"""
-		for t in self.tracks:
-			# add current position to last_pos list
-			t.last_pos.append(t.pos.clone())
+		# active tracks which get new appearance features
+		refresh = torch.zeros(0, dtype=torch.long)
+
+		# add current position to last_pos list
+		self.bank.push_last_pos(self.bank.active())
+		if self.motion_model_cfg['enabled']:
+			self.motion_model.update(self.bank.active())
 
 		###########################
 		# Look for new detections #
 		###########################
 
-		self.obj_detect.load_image(blob['img'])
+		if load_image:
+			self.obj_detect.load_image(blob['img'], blob.get('img_path'))
 
 		if self.public_detections:
 			dets = blob['dets'].squeeze(dim=0)
 			if dets.nelement() > 0:
 				boxes, scores = self.obj_detect.predict_boxes(dets)
 			else:
-				boxes = scores = torch.zeros(0).cuda()
+				boxes = scores = torch.zeros(0, device=self.device)
 		else:
-			boxes, scores = self.obj_detect.detect(blob['img'])
+			boxes, scores = self.obj_detect.detect_loaded_image()
 
 		if boxes.nelement() > 0:
 			boxes = clip_boxes_to_image(boxes, blob['img'].shape[-2:])
@@ -275,23 +280,21 @@ class Tracker:
 			# Filter out tracks that have too low person score
 			inds = torch.gt(scores, self.detection_person_thresh).nonzero().view(-1)
 		else:
-			inds = torch.zeros(0).cuda()
+			inds = torch.zeros(0, device=self.device)
 
 		if inds.nelement() > 0:
 			det_pos = boxes[inds]
 
 			det_scores = scores[inds]
 		else:
-			det_pos = torch.zeros(0).cuda()
-			det_scores = torch.zeros(0).cuda()
+			det_pos = torch.zeros(0, device=self.device)
+			det_scores = torch.zeros(0, device=self.device)
 
 		##################
 		# Predict tracks #
 		##################
 
-		num_tracks = 0
-		nms_inp_reg = torch.zeros(0).cuda()
-		if len(self.tracks):
+		if len(self.bank.active()):
 			# align
 			if self.do_align:
 				self.align(blob)
@@ -299,57 +302,53 @@ class Tracker:
 			# apply motion model
 			if self.motion_model_cfg['enabled']:
 				self.motion()
-				self.tracks = [t for t in self.tracks if t.has_positive_area()]
+				active = self.bank.active()
+				self.bank.remove(active[~self.bank.has_positive_area(active)])
 
 			# regress
 			person_scores = self.regress_tracks(blob)
 
-			if len(self.tracks):
-				# create nms input
-
+			active = self.bank.active()
+			if len(active):
 				# nms here if tracks overlap
-				keep = nms(self.get_pos(), person_scores, self.regression_nms_thresh)
+				keep = nms(self.bank.pos[active], person_scores, self.regression_nms_thresh)
 
-				self.tracks_to_inactive([self.tracks[i] for i in list(range(len(self.tracks))) if i not in keep])
+				killed = torch.ones(len(active), dtype=torch.bool)
+				killed[keep.cpu()] = False
+				self.tracks_to_inactive(active[killed])
 
 				if keep.nelement() > 0 and self.do_reid:
-						new_features = self.get_appearances(blob)
-						self.add_features(new_features)
+						refresh = self.refresh_slots()
 
 		#####################
 		# Create new tracks #
 		#####################
 
-		# !!! Here NMS is used to filter out detections that are already covered by tracks. This is
-		# !!! done by iterating through the active tracks one by one, assigning them a bigger score
-		# !!! than 1 (maximum score for detections) and then filtering the detections with NMS.
-		# !!! In the paper this is done by calculating the overlap with existing tracks, but the
-		# !!! result stays the same.
+		# !!! Here detections that are already covered by tracks are filtered out by calculating
+		# !!! their overlap with all active tracks at once, as in the paper (see
+		# !!! filter_covered_detections).
 		if det_pos.nelement() > 0:
 			keep = nms(det_pos, det_scores, self.detection_nms_thresh)
 			det_pos = det_pos[keep]
 			det_scores = det_scores[keep]
 
 			# check with every track in a single run (problem if tracks delete each other)
-			for t in self.tracks:
-				nms_track_pos = torch.cat([t.pos, det_pos])
-				nms_track_scores = torch.cat(
-					[torch.tensor([2.0]).to(det_scores.device), det_scores])
-				keep = nms(nms_track_pos, nms_track_scores, self.detection_nms_thresh)
+			det_pos, det_scores = self.filter_covered_detections(det_pos, det_scores)
 
-				keep = keep[torch.ge(keep, 1)] - 1
-
-				det_pos = det_pos[keep]
-				det_scores = det_scores[keep]
-				if keep.nelement() == 0:
-					break
+		# one reid forward pass for the refreshed tracks and the new detections
+		det_features = None
+		if self.do_reid:
+			refresh_features, det_features = self.embed(blob, [self.bank.pos[refresh], det_pos])
+			if len(refresh):
+				self.bank.add_features(refresh, refresh_features)
 
 		if det_pos.nelement() > 0:
 			new_det_pos = det_pos
 			new_det_scores = det_scores
 
 			# try to reidentify tracks
-			new_det_pos, new_det_scores, new_det_features = self.reid(blob, new_det_pos, new_det_scores)
+			new_det_pos, new_det_scores, new_det_features = self.reid(
+				blob, new_det_pos, new_det_scores, det_features)
 
 			# add new
 			if new_det_pos.nelement() > 0:
@@ -359,60 +358,23 @@ class Tracker:
 		# Generate Results #
 		####################
 
-		for t in self.tracks:
-			if t.id not in self.results.keys():
-				self.results[t.id] = {}
-			self.results[t.id][self.im_index] = np.concatenate([t.pos[0].cpu().numpy(), np.array([t.score])])
+		active = self.bank.active()
+		if len(active):
+			# one transfer for the boxes and scores of all active tracks
+			boxes = torch.cat([self.bank.pos[active], self.bank.score[active].view(-1, 1)], 1).cpu().numpy()
+			self.results.append(self.im_index, self.bank.ids[active].numpy(), boxes)
 
-		for t in self.inactive_tracks:
-			t.count_inactive += 1
+		inactive = self.bank.inactive()
+		self.bank.count_inactive[inactive] += 1
 
-		self.inactive_tracks = [
-			t for t in self.inactive_tracks if t.has_positive_area() and t.count_inactive <= self.inactive_patience
-		]
+		dead = ~self.bank.has_positive_area(inactive) | torch.gt(self.bank.count_inactive[inactive], self.inactive_patience)
+		self.bank.remove(inactive[dead])
 
 		self.im_index += 1
-		self.last_image = blob['img'][0]
+		if self.do_align:
+			self.aligner.next_frame(blob['img'][0])
 
 	def get_results(self):
-		return self.results
-
-
-class Track(object):
-	"""This class contains all necessary for every individual track."""
-
-	def __init__(self, pos, score, track_id, features, inactive_patience, max_features_num, mm_steps):
-		self.id = track_id
-		self.pos = pos
-		self.score = score
-		self.features = deque([features])
-		self.ims = deque([])
-		self.count_inactive = 0
-		self.inactive_patience = inactive_patience
-		self.max_features_num = max_features_num
-		self.last_pos = deque([pos.clone()], maxlen=mm_steps + 1)
-		self.last_v = torch.Tensor([])
-		self.gt_id = None
-
-	def has_positive_area(self):
-		return self.pos[0, 2] > self.pos[0, 0] and self.pos[0, 3] > self.pos[0, 1]
-
-	def add_features(self, features):
-		"""Adds new appearance features to the object."""
-		self.features.append(features)
-		if len(self.features) > self.max_features_num:
-			self.features.popleft()
-
-	def test_features(self, test_features):
-		"""Compares test_features to features of this Track object"""
-		if len(self.features) > 1:
-			features = torch.cat(list(self.features), dim=0)
-		else:
-			features = self.features[0]
-		features = features.mean(0, keepdim=True)
-		dist = F.pairwise_distance(features, test_features, keepdim=True)
-		return dist
-
-	def reset_last_pos(self):
-		self.last_pos.clear()
-		self.last_pos.append(self.pos.clone())
+		"""Results as {id: {frame: np.array([x1, y1, x2, y2, score])}}."""
+		self.results.flush()
+		return self.results.as_dict()
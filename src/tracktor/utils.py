@@ -80,6 +80,26 @@ def bbox_overlaps(boxes, query_boxes):
     return out_fn(overlaps)
 
 
+def box_ioa(boxes, query_boxes):
+    """(N, K) intersection of boxes and query_boxes over the area of boxes, i.e. the
+    fraction of each box covered by each query box."""
+    lt = torch.max(boxes[:, None, :2], query_boxes[None, :, :2])
+    rb = torch.min(boxes[:, None, 2:], query_boxes[None, :, 2:])
+    inter = (rb - lt).clamp(min=0).prod(dim=2)
+    area = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    return inter / area.clamp(min=1e-6).view(-1, 1)
+
+
+def paired_box_iou(boxes1, boxes2):
+    """(N,) IoU of each box in boxes1 with the box at the same index in boxes2."""
+    lt = torch.max(boxes1[:, :2], boxes2[:, :2])
+    rb = torch.min(boxes1[:, 2:], boxes2[:, 2:])
+    inter = (rb - lt).clamp(min=0).prod(dim=1)
+    area1 = (boxes1[:, 2] - boxes1[:, 0]) * (boxes1[:, 3] - boxes1[:, 1])
+    area2 = (boxes2[:, 2] - boxes2[:, 0]) * (boxes2[:, 3] - boxes2[:, 1])
+    return inter / (area1 + area2 - inter).clamp(min=1e-6)
+
+
 def plot_sequence(tracks, db, output_dir):
     """Plots a whole sequence
 
@@ -296,7 +316,7 @@ def get_center(pos):
     y1 = pos[0, 1]
     x2 = pos[0, 2]
     y2 = pos[0, 3]
-    return torch.Tensor([(x2 + x1) / 2, (y2 + y1) / 2]).cuda()
+    return torch.stack([(x2 + x1) / 2, (y2 + y1) / 2])
 
 
 def get_width(pos):
@@ -308,26 +328,39 @@ def get_height(pos):
 
 
 def make_pos(cx, cy, width, height):
-    return torch.Tensor([[
+    return torch.stack([
         cx - width / 2,
         cy - height / 2,
         cx + width / 2,
         cy + height / 2
-    ]]).cuda()
+    ]).view(1, -1)
 
 
 def warp_pos(pos, warp_matrix):
-    p1 = torch.Tensor([pos[0, 0], pos[0, 1], 1]).view(3, 1)
-    p2 = torch.Tensor([pos[0, 2], pos[0, 3], 1]).view(3, 1)
-    p1_n = torch.mm(warp_matrix, p1).view(1, 2)
-    p2_n = torch.mm(warp_matrix, p2).view(1, 2)
-    return torch.cat((p1_n, p2_n), 1).view(1, -1).cuda()
+    return warp_boxes(pos, warp_matrix)
+
+
+def warp_boxes(boxes, warp_matrix):
+    """Warps the corners of all boxes at once.
+
+    Args:
+        boxes (torch.Tensor): Boxes of shape (..., 4) as x1, y1, x2, y2
+        warp_matrix (torch.Tensor): 2x3 (euclidean, affine) or 3x3 (homography) warp matrix on the
+            same device as boxes
+    """
+    corners = boxes.reshape(-1, 2, 2)
+    corners = torch.cat((corners, torch.ones_like(corners[..., :1])), 2)
+    warped = torch.matmul(corners, warp_matrix.t())
+    if warp_matrix.size(0) == 3:
+        warped = warped[..., :2] / warped[..., 2:]
+    return warped.reshape(boxes.shape)
 
 
 def get_mot_accum(results, seq):
     mot_accum = mm.MOTAccumulator(auto_id=True)    
 
-    for i, data in enumerate(seq):
+    # the annotations only, without loading the images
+    for i, data in enumerate(seq.data):
         gt = data['gt']
         gt_ids = []
         if gt:
@@ -0,0 +1,66 @@
+import os
+
+import pytest
+import torch
+import yaml
+from torchvision.ops.boxes import nms
+
+from tracktor.tracker import Tracker
+
+CONFIG = os.path.join(os.path.dirname(__file__), '..', 'experiments', 'cfgs', 'tracktor.yaml')
+
+
+def make_tracker(detection_nms_thresh):
+    with open(CONFIG) as file:
+        tracker_cfg = yaml.safe_load(file)['tracktor']['tracker']
+    tracker_cfg['device'] = 'cpu'
+    tracker_cfg['detection_nms_thresh'] = detection_nms_thresh
+    return Tracker(None, None, tracker_cfg)
+
+
+def per_track_nms(track_pos, det_pos, det_scores, nms_thresh):
+    """The former loop of Tracker.step: an NMS over each track, with a score above all
+    detections, and the remaining detections."""
+    for pos in track_pos:
+        nms_track_pos = torch.cat([pos.view(1, -1), det_pos])
+        nms_track_scores = torch.cat([torch.tensor([2.0]), det_scores])
+        keep = nms(nms_track_pos, nms_track_scores, nms_thresh)
+
+        keep = keep[torch.ge(keep, 1)] - 1
+
+        det_pos = det_pos[keep]
+        det_scores = det_scores[keep]
+        if keep.nelement() == 0:
+            break
+    return det_pos, det_scores
+
+
+def random_boxes(generator, num):
+    # boxes in a small image, so that tracks and detections overlap often
+    xy = torch.rand(num, 2, generator=generator) * 200
+    wh = torch.rand(num, 2, generator=generator) * 60 + 20
+    return torch.cat([xy, xy + wh], dim=1)
+
+
+@pytest.mark.parametrize('nms_thresh', [0.3, 0.5, 0.7])
+def test_equals_per_track_nms(nms_thresh):
+    generator = torch.Generator().manual_seed(0)
+    tracker = make_tracker(nms_thresh)
+
+    for _ in range(300):
+        num_tracks, num_dets = torch.randint(0, 15, (2,), generator=generator).tolist()
+        tracker.reset()
+        track_pos = random_boxes(generator, num_tracks)
+        tracker.add(track_pos, torch.rand(num_tracks, generator=generator), torch.zeros(num_tracks, 128))
+
+        det_pos = random_boxes(generator, num_dets)
+        det_scores = torch.rand(num_dets, generator=generator)
+        # as in Tracker.step, the detections went through an NMS with the same threshold
+        keep = nms(det_pos, det_scores, nms_thresh)
+        det_pos, det_scores = det_pos[keep], det_scores[keep]
+
+        expected_pos, expected_scores = per_track_nms(track_pos, det_pos, det_scores, nms_thresh)
+        pos, scores = tracker.filter_covered_detections(det_pos, det_scores)
+
+        assert torch.equal(pos, expected_pos)
+        assert torch.equal(scores, expected_scores)
@@ -0,0 +1,60 @@
+import numpy as np
+import torch
+
+from tracktor.alignment import Aligner
+from tracktor.multi_stream import LockstepTracker
+
+
+class FrameIndexAligner(Aligner):
+    """Estimates a translation by the difference of the frame indices stored in the images."""
+
+    def prepare(self, image):
+        return image[0, 0, 0].item()
+
+    def estimate_warp(self, last_frame, frame):
+        warp_matrix = self.identity()
+        warp_matrix[0, 2] = frame - last_frame
+        return warp_matrix
+
+
+class StubDetector(object):
+
+    def load_image(self, images, image_paths=None):
+        pass
+
+
+class StubTracker(object):
+    """Uses the aligner like Tracker.step, which only estimates with active tracks."""
+
+    def __init__(self, obj_detect, has_tracks):
+        self.obj_detect = obj_detect
+        self.aligner = FrameIndexAligner(0)
+        self.has_tracks = has_tracks
+        self.warps = []
+
+    def step(self, blob, load_image=True):
+        if self.has_tracks:
+            self.warps.append(self.aligner.estimate(blob['img'][0]))
+        self.aligner.next_frame(blob['img'][0])
+
+
+def frames(num_frames):
+    # frame i moves by i * (i + 1) / 2 pixels, so the warp between consecutive frames is i
+    return [{'img': torch.full((1, 3, 4, 4), i * (i + 1) / 2), 'dets': torch.zeros(1, 0, 4)}
+            for i in range(num_frames)]
+
+
+def test_tracker_without_tracks_does_not_advance_shared_reference():
+    obj_detect = StubDetector()
+    reference = StubTracker(obj_detect, has_tracks=True)
+    trackers = [StubTracker(obj_detect, has_tracks=False), StubTracker(obj_detect, has_tracks=True)]
+    lockstep = LockstepTracker(trackers)
+
+    for blob in frames(5):
+        reference.step(blob)
+        lockstep.step(blob)
+
+    assert trackers[1].warps[0] is None
+    assert [w[0, 2] for w in trackers[1].warps[1:]] == [1, 2, 3, 4]
+    for warp, reference_warp in zip(trackers[1].warps[1:], reference.warps[1:]):
+        np.testing.assert_array_equal(warp, reference_warp)
@@ -0,0 +1,56 @@
+import os
+
+import numpy as np
+import torch
+import yaml
+
+from tracktor.frcnn_fpn import FRCNN_FPN
+from tracktor.multi_stream import MultiStreamTracker
+from tracktor.tracker import Tracker
+
+CONFIG = os.path.join(os.path.dirname(__file__), '..', 'experiments', 'cfgs', 'tracktor.yaml')
+
+
+def tracker_config():
+    with open(CONFIG) as file:
+        tracker_cfg = yaml.safe_load(file)['tracktor']['tracker']
+    # scores of the untrained detector are around 0.5
+    tracker_cfg.update(device='cpu', do_reid=False, detection_person_thresh=0.3,
+                       regression_person_thresh=0.3)
+    return tracker_cfg
+
+
+def stream_frames(generator, num_frames, height=120, width=160):
+    """Frames of a camera panning over a random image with boxes moving along."""
+    background = torch.rand(3, height + 20, width + 20, generator=generator)
+    xy = torch.rand(6, 2, generator=generator) * torch.tensor([width - 40., height - 60.])
+    boxes = torch.cat([xy, xy + torch.tensor([30., 50.])], dim=1)
+    return [{'img': background[None, :, i:i + height, 2 * i:2 * i + width].contiguous(),
+             'dets': (boxes + 2 * i)[None], 'gt': {}, 'vis': {}}
+            for i in range(num_frames)]
+
+
+def test_equals_per_stream_tracking():
+    torch.manual_seed(0)
+    obj_detect = FRCNN_FPN(num_classes=2).eval()
+    obj_detect.transform.min_size = (120,)
+    obj_detect.transform.max_size = 160
+
+    generator = torch.Generator().manual_seed(0)
+    streams = [stream_frames(generator, 5) for _ in range(2)]
+
+    trackers = [Tracker(obj_detect, None, tracker_config()) for _ in streams]
+    multi_stream = MultiStreamTracker([Tracker(obj_detect, None, tracker_config()) for _ in streams])
+    with torch.no_grad():
+        for blobs in zip(*streams):
+            for tracker, blob in zip(trackers, blobs):
+                tracker.step(blob)
+            multi_stream.step(list(blobs))
+
+    for expected, results in zip([t.get_results() for t in trackers], multi_stream.get_results()):
+        assert expected
+        assert expected.keys() == results.keys()
+        for track_id in expected:
+            assert expected[track_id].keys() == results[track_id].keys()
+            for frame in expected[track_id]:
+                np.testing.assert_allclose(results[track_id][frame], expected[track_id][frame], atol=1e-2)